@@ -5,6 +5,7 @@ from .products import router as products_router
 from .cart import router as cart_router
 from .user import router as user_router
 from .rating import router as rating_router
+from .metrics import router as metrics_router
 
 
 router = APIRouter()
@@ -38,3 +39,9 @@ router.include_router(
     prefix='/api/rating',
     tags=['Rating']
 )
+
+router.include_router(
+    metrics_router,
+    prefix='/api/metrics',
+    tags=['Metrics']
+)
@@ -6,7 +6,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.api.schemas.base_response import APISuccessResponse, APISuccessResponseData
 from db.models import User
 from app.core.jwt import create_access_token
-from app.core.security import hash_password, verify_password
+from app.core.security import password_hasher
+from app.core.user_cache import CurrentUser
 from app.api.utils.auth_utils import create_auth_response
 from app.api.schemas.auth_schema import AuthOutSchema, RegisterSchema, LoginSchema
 from app.dependencies import get_current_user, get_session
@@ -20,7 +21,7 @@ router = APIRouter()
 async def register(
     form_data: RegisterSchema = Depends(RegisterSchema.as_form),
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     if current_user:
         raise AlreadyAuthenticatedException()
@@ -55,7 +56,7 @@ async def register(
     user = User(
         email=form_data.email,
         username=form_data.username,
-        hashed_password=hash_password(form_data.password)
+        hashed_password=await password_hasher.hash(form_data.password)
     )
 
     session.add(user)
@@ -75,7 +76,7 @@ async def register(
 async def login(
     form_data: LoginSchema = Depends(LoginSchema.as_form),
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     if current_user:
         raise AlreadyAuthenticatedException()
@@ -85,14 +86,19 @@ async def login(
     if not user:
         raise LoginOrPassNotMatchedException()
 
-    password_validation = verify_password(
-        plain_password=form_data.password,
-        hashed_password=user.hashed_password
+    password_validation, new_hash = await password_hasher.verify(
+        form_data.password,
+        user.hashed_password
     )
 
     if not password_validation:
         raise LoginOrPassNotMatchedException()
 
+    if new_hash is not None:
+        # Хэш со старой стоимостью bcrypt — заменяем, пока знаем пароль
+        user.hashed_password = new_hash
+        await session.commit()
+
     access_token = create_access_token(
         data={
             "id": user.id,
@@ -106,7 +112,7 @@ async def login(
 @router.post('/logout', response_model=APISuccessResponse)
 async def logout(
     response: Response,
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     if not current_user:
         raise NotAuthenticatedException()
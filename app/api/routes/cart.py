@@ -7,7 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.api.schemas.base_response import APISuccessResponse
 from db.models.cart_item import CartItem
 from db.models.product import Product
-from db.models.user import User
+from app.core.user_cache import CurrentUser
 from app.dependencies import get_session, get_current_user
 from app.api.schemas.cart_schema import CartItemListResponse, AddToCartSchema, CartItemOutResponse
 from app.exceptions import NotAuthenticatedException
@@ -19,7 +19,7 @@ router = APIRouter()
 async def add_to_cart(
     payload: AddToCartSchema,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     if not current_user:
         raise NotAuthenticatedException()
@@ -76,7 +76,7 @@ async def add_to_cart(
 @router.get('/', response_model=CartItemListResponse)
 async def get_cart(
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     if not current_user:
         raise NotAuthenticatedException()
@@ -105,7 +105,7 @@ async def get_cart(
 async def remove_from_cart(
     product_id: int,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     if not current_user:
         raise NotAuthenticatedException()
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends
+
+from app.api.utils.auth_utils import is_admin
+from app.core.metrics import collect_metrics
+from app.core.user_cache import CurrentUser
+from app.dependencies import get_current_user
+from app.exceptions import Forbiden, NotAuthenticatedException
+
+
+router = APIRouter()
+
+
+@router.get('/')
+async def get_metrics(
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    # Внутренние счётчики кэшей и очередей — только для администраторов
+    if not current_user:
+        raise NotAuthenticatedException()
+
+    if not is_admin(current_user.id):
+        raise Forbiden()
+
+    return {
+        'type': 'success',
+        'msg': 'Метрики получены',
+        'data': collect_metrics()
+    }
@@ -1,50 +1,238 @@
 import os
+import shutil
+import zipfile
+import tempfile
 import aiofiles
+import orjson
+from typing import Literal, Optional
 from uuid import uuid4
 from dotenv import load_dotenv
 
-from fastapi import APIRouter, Depends, Query, status, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, File, Query, Request, Response, UploadFile, status, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy import delete, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.schemas.base_response import APISuccessResponse, APISuccessResponseData
+from db.models.media_job import MediaJob
 from db.models.rating import Rating
-from db.models.user import User
+from app.core.user_cache import CurrentUser
 from db.models.product import Product
-from app.api.schemas.products_schema import ProductListResponse, ProductOutSchema, ProductSchema
-from app.api.utils.photo_utils import validate_file_extension_async, convert_to_webp_async
+from db.session import async_session
+from app.api.schemas.products_schema import (
+    ProductBatchResponse,
+    ProductListResponse,
+    ProductMediaStatusResponse,
+    ProductOutSchema,
+    ProductSchema,
+    ProductSearchResponse
+)
+from app.api.utils.auth_utils import is_admin
+from app.api.utils.catalog_utils import build_products_query, check_products_cursor, make_products_cursor, price_filters
+from app.api.utils.http_cache_utils import conditional_response, make_etag, set_validators
+from app.api.utils.import_utils import detect_format, import_products
+from app.api.utils.pagination_utils import decode_cursor
+from app.api.utils.photo_utils import read_image_upload, validate_file_extension_async
+from app.api.utils.search_utils import build_search_query, tokenize_search_query
+from app.core.media_jobs import enqueue_media_job, get_media_job, media_jobs_wakeup
+from app.core.media_store import (
+    acquire_media,
+    ensure_media_files,
+    find_media,
+    invalidate_restored_products,
+    release_media
+)
+from app.core.cache import PRODUCT_LIST_TAG, make_cache_key, product_cache, product_tag
+from app.core.serialization import json_bytes_response, product_blobs, product_list_body, success_body
+from app.core.counters import (
+    CATALOG_VERSION_COUNTER,
+    PRODUCTS_COUNTER,
+    estimate_row_count,
+    get_counter,
+    get_counter_row,
+    increment_counter
+)
 from app.dependencies import get_current_user, get_session
 from app.exceptions import Forbiden, NotAuthenticatedException
 
 
+load_dotenv()
+PRODUCT_BATCH_MAX = int(os.getenv('PRODUCT_BATCH_MAX', 100))
+
 router = APIRouter()
 
 
 @router.get("/", response_model=ProductListResponse)
 async def get_products(
-    session: AsyncSession = Depends(get_session),
+    request: Request,
     page: int = Query(1, ge=1),
-    page_size: int = Query(12, ge=1, le=100)
+    page_size: int = Query(12, ge=1, le=100),
+    after: Optional[str] = Query(None, max_length=256),
+    estimate_total: bool = Query(False),
+    sort: Literal['default', 'newest', 'price', 'price_desc', 'top_rated'] = Query('default'),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0)
 ):
-    offset = (page - 1) * page_size
+    cursor = None
+    if after:
+        # Keyset-режим: продолжаем с ключа последнего товара предыдущей страницы,
+        # поэтому стоимость запроса не зависит от глубины листания
+        cursor = decode_cursor(after)
+        check_products_cursor(cursor, sort)
+        page = None
 
-    total = await session.scalar(
-        select(func.count())
-        .select_from(Product)
+    key = make_cache_key(
+        'products:list',
+        page=page,
+        page_size=page_size,
+        after=after,
+        estimate_total=estimate_total,
+        sort=sort,
+        min_price=min_price,
+        max_price=max_price
     )
 
-    products = await session.scalars(
-        select(Product)
-        .offset(offset)
-        .limit(page_size)
+    not_modified = await conditional_response(request, product_cache, key, read_catalog_validators)
+    if not_modified is not None:
+        return not_modified
+
+    cached = await cached_products_page(
+        key,
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        estimate_total=estimate_total,
+        sort=sort,
+        min_price=min_price,
+        max_price=max_price
     )
 
+    response = json_bytes_response(cached['body'])
+    set_validators(response, cached['etag'], cached['last_modified'])
+    return response
+
+
+async def cached_products_page(key: str, **params) -> dict:
+    async def load():
+        async with async_session() as session:
+            return await load_products_page(session, **params)
+
+    return await product_cache.get_or_load(key, load, tags=(PRODUCT_LIST_TAG,))
+
+
+async def first_products_page() -> dict:
+    """GET /api/products/ без параметров — та же запись кэша; встраивается в SPA"""
+    params = dict(page=1, page_size=12, estimate_total=False, sort='default', min_price=None, max_price=None)
+    return await cached_products_page(make_cache_key('products:list', **params), cursor=None, **params)
+
+
+async def read_catalog_validators(session: AsyncSession) -> tuple:
+    row = await get_counter_row(session, CATALOG_VERSION_COUNTER)
+    if row is None:
+        return None, None
+    return make_etag('catalog', row.value), row.updated_at
+
+
+async def load_products_page(
+    session: AsyncSession,
+    page: Optional[int],
+    page_size: int,
+    cursor: Optional[dict],
+    estimate_total: bool,
+    sort: str,
+    min_price: Optional[float],
+    max_price: Optional[float]
+) -> dict:
+    # Версию читаем до данных: данные не могут оказаться старее ETag
+    etag, last_modified = await read_catalog_validators(session)
+
+    total = None
+    total_estimated = False
+    filtered = min_price is not None or max_price is not None
+
+    if filtered:
+        # Счётчик ведётся по всей таблице, отфильтрованный total считаем
+        # по диапазону ix_products_price_id
+        total = await session.scalar(
+            select(func.count())
+            .select_from(Product)
+            .where(*price_filters(Product.price, min_price, max_price))
+        )
+
+    if total is None and estimate_total:
+        total = await estimate_row_count(session, Product.__tablename__)
+        total_estimated = total is not None
+
+    if total is None:
+        total = await get_counter(session, PRODUCTS_COUNTER)
+
+    if total is None:
+        total = await session.scalar(
+            select(func.count())
+            .select_from(Product)
+        )
+
+    query = build_products_query(
+        sort=sort,
+        min_price=min_price,
+        max_price=max_price,
+        cursor=cursor
+    ).limit(page_size + 1)
+
+    if cursor is None:
+        query = query.offset((page - 1) * page_size)
+
+    products = (await session.scalars(query)).all()
+
+    next_cursor = None
+    if len(products) > page_size:
+        products = products[:page_size]
+        next_cursor = make_products_cursor(products[-1], sort)
+
+    body = product_list_body(
+        "Продукты успешно получены",
+        {
+            "total": total,
+            "total_estimated": total_estimated,
+            "page": page,
+            "page_size": page_size,
+            "next_cursor": next_cursor
+        },
+        products
+    )
+
+    return {
+        "etag": etag,
+        "last_modified": last_modified,
+        "body": body
+    }
+
+
+@router.get('/search', response_model=ProductSearchResponse)
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=128),
+    session: AsyncSession = Depends(get_session),
+    page: int = Query(1, ge=1, le=50),
+    page_size: int = Query(12, ge=1, le=100)
+):
+    tokens = tokenize_search_query(q)
+    products = []
+
+    if tokens:
+        statement, params = build_search_query(session.bind.dialect.name, tokens)
+        products = await session.scalars(
+            statement
+            .offset((page - 1) * page_size)
+            .limit(page_size),
+            params
+        )
+
     return {
         "type": "success",
-        "msg": "Продукты успешно получены",
+        "msg": "Поиск выполнен",
         "data": {
-            "total": total,
+            "query": q,
             "page": page,
             "page_size": page_size,
             "items": products
@@ -52,11 +240,56 @@ async def get_products(
     }
 
 
+@router.get('/batch', response_model=ProductBatchResponse)
+async def get_products_batch(
+    ids: str = Query(..., max_length=2048, description="id товаров через запятую"),
+    session: AsyncSession = Depends(get_session)
+):
+    try:
+        requested = [int(product_id) for product_id in ids.split(',') if product_id.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={
+                'type': 'error',
+                'msg': 'ids должен быть списком целых чисел через запятую.'
+            }
+        )
+
+    # Повторы убираем, порядок запроса сохраняем
+    requested = list(dict.fromkeys(requested))
+
+    if len(requested) > PRODUCT_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={
+                'type': 'error',
+                'msg': f'За один запрос можно получить не больше {PRODUCT_BATCH_MAX} товаров.'
+            }
+        )
+
+    found = {}
+    if requested:
+        products = await session.scalars(select(Product).where(Product.id.in_(requested)))
+        found = {product.id: product for product in products}
+
+    items = b','.join(product_blobs.get(found[product_id]) for product_id in requested if product_id in found)
+    missing = [product_id for product_id in requested if product_id not in found]
+
+    return json_bytes_response(
+        success_body(
+            'Продукты успешно получены',
+            b'{"items":[' + items + b'],"missing":' + orjson.dumps(missing) + b'}'
+        )
+    )
+
+
 @router.post('/', response_model=APISuccessResponse)
 async def create_product(
     form_data: ProductSchema = Depends(ProductSchema.as_form),
+    background: bool = Query(False, description="Конвертировать картинку в фоне и сразу ответить 202"),
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     if not current_user:
         raise NotAuthenticatedException()
@@ -74,28 +307,57 @@ async def create_product(
             }
         )
 
-    file_ext = os.path.splitext(photo.filename)[-1]
-    filename = f"{uuid4().hex}{file_ext}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
+    await validate_file_extension_async(filename=photo.filename)
+
+    # Формат и размеры проверяются по первым килобайтам, дальше картинка
+    # декодируется из памяти — на диск пишется только готовый WebP
+    data, image_format, digest = await read_image_upload(photo)
 
-    await validate_file_extension_async(filename=filename)
+    # Уже сохранённую картинку не нужно ни кодировать, ни ставить в очередь
+    if background and await find_media(digest) is None:
+        # Воркеру нужен файл, который переживёт перезапуск
+        file_path = os.path.join(UPLOAD_DIR, f"{uuid4().hex}.{image_format}")
+        async with aiofiles.open(file_path, "wb") as out_file:
+            await out_file.write(data)
 
-    async with aiofiles.open(file_path, "wb") as out_file:
-        while content := await photo.read(1024 * 1024):
-            await out_file.write(content)
+        return await create_product_in_background(session, form_data, file_path, digest)
 
-    file_path_webp = await convert_to_webp_async(file_path=file_path)
+    media_variants = await ensure_media_files(digest, data)
 
     # Загрузка в базу данных
     product = Product(
         name=form_data.name,
         description=form_data.description,
         price=form_data.price,
-        media=file_path_webp
+        media=media_variants['original'],
+        media_variants=media_variants,
+        media_hash=digest
     )
 
     session.add(product)
+    await acquire_media(session, digest, media_variants, data)
+    await increment_counter(session, PRODUCTS_COUNTER)
+    await increment_counter(session, CATALOG_VERSION_COUNTER)
     await session.commit()
+
+    await invalidate_restored_products(session)
+    await product_cache.invalidate_tag(PRODUCT_LIST_TAG)
+
+    if background:
+        # Тот же ответ, что и при постановке в очередь: картинка уже готова
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={
+                'type': 'success',
+                'msg': 'Продукт успешно загружен!',
+                'data': {
+                    'product_id': product.id,
+                    'job_id': None,
+                    'media_status': product.media_status
+                }
+            }
+        )
+
     return JSONResponse(
         status_code=status.HTTP_200_OK,
         content={
@@ -105,11 +367,166 @@ async def create_product(
     )
 
 
+async def create_product_in_background(session: AsyncSession, form_data: ProductSchema, file_path: str, digest: str):
+    """Товар сохраняется сразу с media_status=pending, картинку конвертирует run_media_worker"""
+    product = Product(
+        name=form_data.name,
+        description=form_data.description,
+        price=form_data.price,
+        media_hash=digest
+    )
+
+    job = await enqueue_media_job(session, product, file_path)
+    await increment_counter(session, PRODUCTS_COUNTER)
+    await increment_counter(session, CATALOG_VERSION_COUNTER)
+    await session.commit()
+
+    media_jobs_wakeup.set()
+    await product_cache.invalidate_tag(PRODUCT_LIST_TAG)
+
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            'type': 'success',
+            'msg': 'Продукт сохранён, картинка обрабатывается.',
+            'data': {
+                'product_id': product.id,
+                'job_id': job.id,
+                'media_status': product.media_status
+            }
+        }
+    )
+
+
+@router.post('/import')
+async def import_products_route(
+    manifest: UploadFile = File(..., description="CSV или NDJSON: name, description, price, image"),
+    images: UploadFile = File(..., description="zip-архив с картинками из колонки image"),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    if not current_user:
+        raise NotAuthenticatedException()
+
+    if not is_admin(current_user.id):
+        raise Forbiden()
+
+    fmt = detect_format(manifest.filename)
+
+    # Загрузки копируются на диск чанками: zip требует seek, а манифест
+    # дальше читается построчно уже в фоне ответа
+    spooled = await run_in_threadpool(spool_import_files, manifest.file, images.file)
+    if spooled is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                'type': 'error',
+                'msg': 'Картинки должны быть zip-архивом.'
+            }
+        )
+
+    manifest_tmp, images_tmp = spooled
+
+    async def stream():
+        try:
+            with open(manifest_tmp, 'rb') as manifest_file:
+                async for event in import_products(manifest_file, fmt, images_tmp):
+                    yield orjson.dumps(event) + b'\n'
+        finally:
+            os.remove(manifest_tmp)
+            os.remove(images_tmp)
+
+    return StreamingResponse(stream(), media_type='application/x-ndjson')
+
+
+def spool_to_tempfile(source, suffix: str) -> str:
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as out_file:
+        shutil.copyfileobj(source, out_file, 1024 * 1024)
+        return out_file.name
+
+
+def spool_import_files(manifest, images) -> Optional[tuple]:
+    """
+    Обе загрузки импорта — во временные файлы, с проверкой архива.
+    (манифест, архив) или None, если картинки не zip (файлы тогда удалены)
+    """
+    manifest_tmp = spool_to_tempfile(manifest, '.manifest')
+    images_tmp = spool_to_tempfile(images, '.zip')
+    if zipfile.is_zipfile(images_tmp):
+        return manifest_tmp, images_tmp
+
+    os.remove(manifest_tmp)
+    os.remove(images_tmp)
+    return None
+
+
 @router.get('/{product_id}', response_model=APISuccessResponseData[ProductOutSchema])
 async def get_product(
     product_id: int,
-    session: AsyncSession = Depends(get_session),
+    request: Request,
 ):
+    key = make_cache_key('products:detail', product_id=product_id)
+
+    async def read_validators(session: AsyncSession) -> tuple:
+        row = (await session.execute(
+            select(Product.version, Product.updated_at)
+            .where(Product.id == product_id)
+        )).first()
+        if row is None:
+            return None, None
+        return make_etag('product', product_id, row.version), row.updated_at
+
+    not_modified = await conditional_response(request, product_cache, key, read_validators)
+    if not_modified is not None:
+        return not_modified
+
+    cached = await cached_product(product_id)
+
+    response = json_bytes_response(cached['body'])
+    set_validators(response, cached['etag'], cached['last_modified'])
+    return response
+
+
+@router.get('/{product_id}/media', response_model=ProductMediaStatusResponse)
+async def get_product_media_status(
+    product_id: int,
+    session: AsyncSession = Depends(get_session)
+):
+    product = await session.scalar(select(Product).where(Product.id == product_id))
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                'type': 'error',
+                'msg': f"Продукт с id: {product_id} не существует."
+            }
+        )
+
+    job = await get_media_job(session, product_id)
+
+    return {
+        'type': 'success',
+        'msg': 'Статус картинки получен',
+        'data': {
+            'product_id': product.id,
+            'media_status': product.media_status,
+            'media': product.media,
+            'media_variants': product.media_variants or {},
+            'job': job
+        }
+    }
+
+
+async def cached_product(product_id: int) -> dict:
+    """Запись кэша GET /api/products/{id}; 404 — HTTPException из load_product"""
+    async def load():
+        async with async_session() as session:
+            return await load_product(session, product_id)
+
+    key = make_cache_key('products:detail', product_id=product_id)
+    return await product_cache.get_or_load(key, load, tags=(product_tag(product_id),))
+
+
+async def load_product(session: AsyncSession, product_id: int) -> dict:
     product = await session.scalar(
         select(Product)
         .where(Product.id == product_id)
@@ -124,29 +541,18 @@ async def get_product(
             }
         )
 
-    return JSONResponse(
-        status_code=status.HTTP_200_OK,
-        content={
-            'type': 'success',
-            'msg': f"Продукт с id: {product_id} успешно найден!",
-            'data': {
-                'id': product.id,
-                'name': product.name,
-                'description': product.description,
-                'price': float(product.price) if product.price else None,
-                'media': product.media,
-                'created_at': product.created_at.isoformat() if product.created_at else None,
-                'updated_at': product.updated_at.isoformat() if product.updated_at else None
-            }
-        }
-    )
+    return {
+        'body': success_body(f"Продукт с id: {product_id} успешно найден!", product_blobs.get(product)),
+        'etag': make_etag('product', product.id, product.version),
+        'last_modified': product.updated_at
+    }
 
 
 @router.delete('/{product_id}', response_model=APISuccessResponse)
 async def delete_product(
     product_id: int,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     if not current_user:
         raise NotAuthenticatedException()
@@ -161,17 +567,24 @@ async def delete_product(
             }
         )
 
-    load_dotenv()
-    ADMIN_IDS = os.getenv('REACT_APP_ADMIN_IDS').split(',')
-
-    if str(current_user.id) not in ADMIN_IDS:
+    if not is_admin(current_user.id):
         raise Forbiden()
 
     await session.execute(
         delete(Rating).where(Rating.product_id == product_id)
     )
+    await session.execute(
+        delete(MediaJob).where(MediaJob.product_id == product_id)
+    )
+
+    # Пока задача в очереди, ссылки на картинку у товара ещё нет.
+    # Файлы без ссылок потом уберёт media_gc
+    if product.media_status == 'ready':
+        await release_media(session, product.media_hash)
 
     await session.delete(product)
+    await increment_counter(session, PRODUCTS_COUNTER, -1)
+    await increment_counter(session, CATALOG_VERSION_COUNTER)
     try:
         await session.commit()
     except Exception as e:
@@ -181,6 +594,9 @@ async def delete_product(
             detail=f"Ошибка при удалении товара: {str(e)}"
         )
 
+    await product_cache.invalidate_tag(product_tag(product_id), hard=True)
+    await product_cache.invalidate_tag(PRODUCT_LIST_TAG)
+
     return {
         'type': 'success',
         'msg': 'Товар успешно удалён!'
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.models.user import User
+from app.core.user_cache import CurrentUser
+from db.models.product import Product
 from db.models.rating import Rating
 
 from app.api.schemas.base_response import APISuccessResponse, APISuccessResponseData
 from app.api.schemas.rating_schema import GetRatingsResponse, GetUserRatingData, GetUserRatingsData, RateProductSchema
+from app.api.utils.http_cache_utils import is_not_modified, make_etag, not_modified_response, set_validators
+from app.api.utils.rating_utils import RATING_HISTOGRAM_COLUMNS, apply_rating_change
+from app.core.cache import PRODUCT_LIST_TAG, product_cache, product_tag
+from app.core.counters import CATALOG_VERSION_COUNTER, increment_counter
 
 from app.dependencies import get_current_user, get_session
 from app.exceptions import Forbiden, NotAuthenticatedException
@@ -21,40 +26,71 @@ async def rate_product(
     product_id: int,
     data: RateProductSchema = Depends(RateProductSchema.as_form),
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     if not current_user:
         raise NotAuthenticatedException()
 
+    # Блокируем строку оценки: два одновременных переоценивания одним
+    # пользователем иначе применят дельты от одной и той же старой оценки
     existing_rating = await session.scalar(
         select(Rating)
         .where(
             Rating.user_id == current_user.id,
             Rating.product_id == product_id
         )
+        .with_for_update()
     )
-    if data.rating == 0:
-        if existing_rating:
-            await session.delete(existing_rating)
+    old_rating = existing_rating.rating if existing_rating else 0
 
-    if data.rating > 0:
-        if existing_rating:
-            existing_rating.rating = data.rating
-
-        if not existing_rating:
-            new_rating = Rating(
-                user_id=current_user.id,
+    try:
+        if data.rating == 0:
+            if existing_rating:
+                await session.delete(existing_rating)
+
+        if data.rating > 0:
+            if existing_rating:
+                existing_rating.rating = data.rating
+
+            if not existing_rating:
+                new_rating = Rating(
+                    user_id=current_user.id,
+                    product_id=product_id,
+                    rating=data.rating
+                )
+                session.add(new_rating)
+
+        if old_rating != data.rating:
+            # Autoflush вставки здесь упирается в user_product_unique, если
+            # тот же пользователь параллельно поставил первую оценку
+            product_exists = await apply_rating_change(
+                session,
                 product_id=product_id,
-                rating=data.rating
+                old_rating=old_rating,
+                new_rating=data.rating
             )
-            session.add(new_rating)
+            if not product_exists:
+                await session.rollback()
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail={
+                        'type': 'error',
+                        'msg': f"Продукт с id: {product_id} не существует."
+                    }
+                )
+
+            # Агрегаты оценок входят в листинг каталога
+            await increment_counter(session, CATALOG_VERSION_COUNTER)
 
-    try:
         await session.commit()
     except IntegrityError:
         await session.rollback()
         raise HTTPException(status_code=400, detail="Invalid product or user")
 
+    if old_rating != data.rating:
+        await product_cache.invalidate_tag(product_tag(product_id))
+        await product_cache.invalidate_tag(PRODUCT_LIST_TAG)
+
     return {
         'type': 'success',
         'msg': 'Рейтинг успешно опубликован!',
@@ -64,19 +100,46 @@ async def rate_product(
 @router.get('/{product_id}', response_model=APISuccessResponseData[GetRatingsResponse])
 async def get_ratings(
     product_id: int,
+    request: Request,
+    response: Response,
     session: AsyncSession = Depends(get_session)
 ):
-    ratings = await session.scalars(select(Rating).where(Rating.product_id == product_id))
-    ratings_list = ratings.all()
+    # Только агрегаты и версия, без описания и остальных полей товара
+    product = (await session.execute(
+        select(
+            Product.version,
+            Product.updated_at,
+            Product.rating_count,
+            Product.rating_sum,
+            Product.rating_avg,
+            *RATING_HISTOGRAM_COLUMNS
+        )
+        .where(Product.id == product_id)
+    )).first()
+
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                'type': 'error',
+                'msg': f"Продукт с id: {product_id} не существует."
+            }
+        )
 
-    rating_values = [r.rating for r in ratings_list]
+    etag = make_etag('rating', product_id, product.version)
+    if is_not_modified(request, etag, product.updated_at):
+        return not_modified_response(etag, product.updated_at)
+    set_validators(response, etag, product.updated_at)
 
     return {
         'type': 'success',
         'msg': 'Успешно получены данные!',
         'data': {
             'product_id': product_id,
-            'ratings': rating_values
+            'rating_count': product.rating_count,
+            'rating_sum': product.rating_sum,
+            'rating_avg': product.rating_avg,
+            'rating_histogram': [getattr(product, column.key) for column in RATING_HISTOGRAM_COLUMNS]
         }
     }
 
@@ -86,7 +149,7 @@ async def get_user_rating(
     product_id: int,
     user_id: int,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     if not current_user:
         raise NotAuthenticatedException()
@@ -123,7 +186,7 @@ async def get_user_rating(
 async def get_user_ratings(
     user_id: int,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     if not current_user:
         raise NotAuthenticatedException()
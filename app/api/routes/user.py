@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, Response, status, HTTPException
-from sqlalchemy import select
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.schemas.base_response import APISuccessResponseData
@@ -8,7 +8,8 @@ from app.core.jwt import create_access_token
 from db.models.user import User
 from app.api.schemas.user_schema import GetUserSchema, UpdateUserSchema
 
-from app.core.security import hash_password
+from app.core.security import password_hasher
+from app.core.user_cache import CurrentUser, user_cache
 from app.dependencies import get_current_user, get_session
 from app.exceptions import Forbiden, NotAuthenticatedException
 
@@ -18,23 +19,13 @@ router = APIRouter()
 
 @router.get('/me', response_model=GetUserSchema)
 async def get_me(
-    session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     if not current_user:
         raise NotAuthenticatedException
 
-    user = await session.scalar(select(User).where(User.id == current_user.id))
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail={
-                'type': 'error',
-                'msg': 'Пользователь не найден.'
-            }
-        )
-
-    return user
+    # get_current_user уже прочитал пользователя (или взял из user_cache)
+    return current_user
 
 
 @router.put('/update', response_model=APISuccessResponseData)
@@ -42,21 +33,17 @@ async def update_user(
     response: Response,
     form_data: UpdateUserSchema = Depends(UpdateUserSchema.as_form),
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     if not current_user:
         raise NotAuthenticatedException()
 
-    user = await session.scalar(select(User).where(User.id == current_user.id))
-
-    if not user:
-        raise Forbiden()
-
+    values = {}
     if form_data.email:
-        user.email = form_data.email
+        values['email'] = form_data.email
 
     if form_data.username:
-        user.username = form_data.username
+        values['username'] = form_data.username
 
     if form_data.password or form_data.confirm_password:
         if not form_data.password:
@@ -86,16 +73,25 @@ async def update_user(
                 }
             )
 
-        user.hashed_password = hash_password(form_data.password)
+        values['hashed_password'] = await password_hasher.hash(form_data.password)
 
-    await session.commit()
+    if values:
+        result = await session.execute(
+            update(User)
+            .where(User.id == current_user.id)
+            .values(**values)
+        )
+        if not result.rowcount:
+            raise Forbiden()
+        await session.commit()
+        user_cache.invalidate(current_user.id)
 
     response.delete_cookie(key='access_token')
 
     access_token = create_access_token(
         data={
-            "id": user.id,
-            "username": user.username
+            "id": current_user.id,
+            "username": values.get('username', current_user.username)
         }
     )
 
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Annotated, List
+from typing import Annotated, Dict, List, Optional
 
 from fastapi import Form, File, UploadFile
 from fastapi.exceptions import RequestValidationError
@@ -8,10 +8,15 @@ from pydantic import BaseModel, ConfigDict, ValidationError
 from app.api.schemas.base_response import APISuccessResponse
 
 
+ProductName = Annotated[str, Form(..., min_length=5, max_length=128)]
+ProductDescription = Annotated[str, Form(..., min_length=32, max_length=512)]
+ProductPrice = Annotated[float, Form(..., ge=0.01, le=999999999.99)]
+
+
 class ProductSchema(BaseModel):
-    name: Annotated[str, Form(..., min_length=5, max_length=128)]
-    description: Annotated[str, Form(..., min_length=32, max_length=512)]
-    price: Annotated[float, Form(..., ge=0.01, le=999999999.99)]
+    name: ProductName
+    description: ProductDescription
+    price: ProductPrice
     media: Annotated[UploadFile, Form(...)]
 
     model_config = ConfigDict(extra='forbid')
@@ -30,12 +35,27 @@ class ProductSchema(BaseModel):
             raise RequestValidationError(e.errors())
 
 
+class ProductImportRowSchema(BaseModel):
+    """Строка манифеста массового импорта: те же правила, что у ProductSchema"""
+    name: ProductName
+    description: ProductDescription
+    price: ProductPrice
+    image: Annotated[str, Form(..., min_length=1, max_length=255)]
+
+    model_config = ConfigDict(extra='ignore')
+
+
 class ProductOutSchema(BaseModel):
     id: int
     name: str
     description: str
     price: float
     media: str
+    media_variants: Dict[str, str] = {}
+    media_status: str = 'ready'
+    rating_count: int = 0
+    rating_avg: float = 0
+    rating_histogram: List[int] = [0, 0, 0, 0, 0]
     created_at: datetime
     updated_at: datetime
 
@@ -44,10 +64,55 @@ class ProductOutSchema(BaseModel):
 
 class PaginatedProductListResponse(BaseModel):
     total: int
-    page: int
+    total_estimated: bool = False
+    page: Optional[int] = None
     page_size: int
+    next_cursor: Optional[str] = None
     items: List[ProductOutSchema]
 
 
 class ProductListResponse(APISuccessResponse):
     data: PaginatedProductListResponse
+
+
+class ProductSearchData(BaseModel):
+    query: str
+    page: int
+    page_size: int
+    items: List[ProductOutSchema]
+
+
+class ProductSearchResponse(APISuccessResponse):
+    data: ProductSearchData
+
+
+class ProductBatchData(BaseModel):
+    items: List[ProductOutSchema]
+    missing: List[int]
+
+
+class ProductBatchResponse(APISuccessResponse):
+    data: ProductBatchData
+
+
+class MediaJobOutSchema(BaseModel):
+    id: int
+    status: str
+    attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ProductMediaStatusData(BaseModel):
+    product_id: int
+    media_status: str
+    media: str
+    media_variants: Dict[str, str]
+    job: Optional[MediaJobOutSchema] = None
+
+
+class ProductMediaStatusResponse(APISuccessResponse):
+    data: ProductMediaStatusData
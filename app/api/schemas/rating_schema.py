@@ -24,7 +24,10 @@ class RateProductSchema(BaseModel):
 
 class GetRatingsResponse(BaseModel):
     product_id: int
-    ratings: List[int]
+    rating_count: int
+    rating_sum: int
+    rating_avg: float
+    rating_histogram: List[int]
 
     model_config = ConfigDict(from_attributes=True)
 
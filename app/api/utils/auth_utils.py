@@ -1,3 +1,6 @@
+import os
+from dotenv import load_dotenv
+
 from fastapi import status, Response
 from fastapi.responses import JSONResponse
 
@@ -20,3 +23,10 @@ async def create_auth_response(message: str, access_token: str):
     )
 
     return response
+
+
+def is_admin(user_id: int) -> bool:
+    load_dotenv()
+    ADMIN_IDS = [admin_id.strip() for admin_id in os.getenv('REACT_APP_ADMIN_IDS', '').split(',')]
+
+    return str(user_id) in ADMIN_IDS
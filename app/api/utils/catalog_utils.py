@@ -0,0 +1,92 @@
+from decimal import Decimal
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, select, tuple_
+
+from app.api.utils.pagination_utils import encode_cursor
+from db.models.product import Product
+
+
+# sort -> (колонка ключа сортировки, по убыванию). Вторым ключом всегда
+# идёт id в том же направлении, так что каждому варианту соответствует
+# индекс: первичный ключ, ix_products_price_id или ix_products_rating_avg_id
+PRODUCT_SORTS = {
+    'default': (None, False),
+    'newest': (None, True),
+    'price': (Product.price, False),
+    'price_desc': (Product.price, True),
+    'top_rated': (Product.rating_avg, True),
+}
+
+
+def build_products_query(
+    sort: str = 'default',
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    cursor: Optional[dict] = None
+) -> Select:
+    """Запрос страницы каталога: фильтр по цене, сортировка и keyset-условие"""
+    sort_column, descending = PRODUCT_SORTS[sort]
+    query = select(Product)
+
+    # Если сортировка идёт не по цене, фильтр по цене остаётся остаточным
+    # условием (price + 0 не попадает в индекс). Иначе планировщик выбирает
+    # диапазон по ix_products_price_id и сортирует результат во временном
+    # дереве, а нам нужен обход индекса сортировки с остановкой по LIMIT
+    price = Product.price if sort_column is Product.price else Product.price + 0
+    query = query.where(*price_filters(price, min_price, max_price))
+
+    if cursor is not None:
+        if sort_column is None:
+            key, after = Product.id, cursor['id']
+        else:
+            key = tuple_(sort_column, Product.id)
+            after = tuple_(_cursor_value(sort_column, cursor), cursor['id'])
+        query = query.where(key < after if descending else key > after)
+
+    if sort_column is None:
+        order = [Product.id]
+    else:
+        order = [sort_column, Product.id]
+
+    return query.order_by(*[column.desc() if descending else column for column in order])
+
+
+def price_filters(price, min_price: Optional[float], max_price: Optional[float]) -> list:
+    filters = []
+    if min_price is not None:
+        filters.append(price >= Decimal(str(min_price)))
+    if max_price is not None:
+        filters.append(price <= Decimal(str(max_price)))
+    return filters
+
+
+def make_products_cursor(product: Product, sort: str) -> str:
+    sort_column, _ = PRODUCT_SORTS[sort]
+    values = {'s': sort, 'id': product.id}
+    if sort_column is not None:
+        values['v'] = float(getattr(product, sort_column.key))
+    return encode_cursor(values)
+
+
+def check_products_cursor(cursor: dict, sort: str):
+    sort_column, _ = PRODUCT_SORTS[sort]
+    valid = cursor.get('s', 'default') == sort
+    if sort_column is not None:
+        valid = valid and isinstance(cursor.get('v'), (int, float))
+
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                'type': 'error',
+                'msg': 'Курсор не соответствует выбранной сортировке.'
+            }
+        )
+
+
+def _cursor_value(sort_column, cursor: dict):
+    if sort_column is Product.price:
+        return Decimal(str(cursor['v']))
+    return cursor['v']
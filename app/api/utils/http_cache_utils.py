@@ -0,0 +1,99 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import ResponseCache
+from db.session import async_session
+
+
+def make_etag(*parts) -> str:
+    """Слабый ETag: совпадение означает то же содержимое, но не побайтово"""
+    return 'W/"' + '-'.join(str(part) for part in parts) + '"'
+
+
+def http_date(value: Optional[datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    # SQLite отдаёт CURRENT_TIMESTAMP без зоны, но это UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def has_conditional_headers(request: Request) -> bool:
+    return 'if-none-match' in request.headers or 'if-modified-since' in request.headers
+
+
+def is_not_modified(request: Request, etag: Optional[str], last_modified: Optional[datetime]) -> bool:
+    """Проверка If-None-Match / If-Modified-Since по RFC 9110: If-None-Match главнее"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        candidates = {_opaque_tag(tag) for tag in if_none_match.split(',')}
+        return _opaque_tag(etag) in candidates
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+
+    return False
+
+
+def set_validators(response: Response, etag: Optional[str], last_modified: Optional[datetime]):
+    if etag is not None:
+        response.headers['ETag'] = etag
+    if last_modified is not None:
+        response.headers['Last-Modified'] = http_date(last_modified)
+    # Хранить можно, но перед использованием — перепроверить
+    response.headers['Cache-Control'] = 'no-cache'
+
+
+def not_modified_response(etag: Optional[str], last_modified: Optional[datetime]) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+async def conditional_response(
+    request: Request,
+    cache: ResponseCache,
+    key: str,
+    read_validators: Callable[[AsyncSession], Awaitable[tuple]]
+) -> Optional[Response]:
+    """
+    Отвечает 304, не загружая сам ресурс. Валидаторы берутся из свежей
+    записи кэша, а если её нет — из read_validators, который должен читать
+    только версию и дату изменения. Возвращает None, если нужен полный ответ.
+    """
+    if not has_conditional_headers(request):
+        return None
+
+    cached = await cache.peek(key)
+    if cached is not None:
+        etag, last_modified = cached['etag'], cached['last_modified']
+    else:
+        async with async_session() as session:
+            etag, last_modified = await read_validators(session)
+
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    return None
+
+
+def _opaque_tag(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith('W/') else tag
@@ -0,0 +1,225 @@
+import os
+import io
+import csv
+import json
+import time
+import asyncio
+import hashlib
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import AsyncIterator, BinaryIO, Iterator
+
+from dotenv import load_dotenv
+from pydantic import ValidationError
+
+from app.api.schemas.products_schema import ProductImportRowSchema
+from app.api.utils.photo_utils import ALLOWED_EXTENSIONS, MAX_FILE_SIZE_MB, inspect_image
+from app.core.cache import PRODUCT_LIST_TAG, product_cache
+from app.core.counters import CATALOG_VERSION_COUNTER, PRODUCTS_COUNTER, increment_counter
+from app.core.media_store import acquire_media, ensure_media_files, invalidate_restored_products
+from db.models.product import Product
+from db.session import async_session
+
+
+load_dotenv()
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 500))
+IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', os.cpu_count() or 2))
+
+
+def detect_format(filename: str) -> str:
+    ext = os.path.splitext(filename or '')[-1].lower()
+    return 'ndjson' if ext in {'.ndjson', '.jsonl'} else 'csv'
+
+
+def read_manifest(manifest: BinaryIO, fmt: str) -> Iterator[tuple]:
+    """
+    Построчно читает манифест, не загружая его целиком.
+    Отдаёт (номер строки, dict) или (номер строки, текст ошибки разбора).
+    """
+    text = io.TextIOWrapper(manifest, encoding='utf-8-sig', newline='')
+
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_no, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, f'Некорректный JSON: {e}'
+            continue
+        if not isinstance(row, dict):
+            yield line_no, 'Строка должна быть JSON-объектом.'
+            continue
+        yield line_no, row
+
+
+def validate_row(row, archive_names: set) -> tuple:
+    """(ProductImportRowSchema, None) или (None, текст ошибки)"""
+    if isinstance(row, str):
+        return None, row
+
+    try:
+        data = ProductImportRowSchema.model_validate(row)
+    except ValidationError as e:
+        return None, '; '.join(
+            f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+            for error in e.errors()
+        )
+
+    ext = os.path.splitext(data.image)[-1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        return None, f'Неподдерживаемый формат файла: {ext}'
+
+    if data.image not in archive_names:
+        return None, f'Файл {data.image} не найден в архиве.'
+
+    return data, None
+
+
+def read_archive_image(archive: zipfile.ZipFile, name: str) -> tuple:
+    info = archive.getinfo(name)
+    if info.file_size > MAX_FILE_SIZE_MB * 1024 * 1024:
+        raise ValueError(f'Файл {name} больше {MAX_FILE_SIZE_MB} МБ.')
+
+    with archive.open(info) as source:
+        data = source.read()
+
+    # Сигнатура и размер холста — до передачи в кодировщик
+    inspect_image(data)
+    return data, hashlib.sha256(data).hexdigest()
+
+
+def _read_archive_bytes(archive: zipfile.ZipFile, name: str) -> bytes:
+    return read_archive_image(archive, name)[0]
+
+
+async def convert_archive_image(
+    archive: zipfile.ZipFile,
+    name: str,
+    pool: ThreadPoolExecutor,
+    limit: asyncio.Semaphore
+) -> tuple:
+    # limit ограничивает число распакованных картинок в памяти;
+    # image_engine с wait=True ждёт места в очереди, а не отказывает.
+    # Повторы картинки в архиве и в каталоге не кодируются заново
+    async with limit:
+        data, digest = await asyncio.get_running_loop().run_in_executor(pool, read_archive_image, archive, name)
+        return digest, await ensure_media_files(digest, data, wait=True)
+
+
+async def import_products(
+    manifest: BinaryIO,
+    fmt: str,
+    archive_path: str,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    workers: int = IMPORT_WORKERS
+) -> AsyncIterator[dict]:
+    """
+    Потоковый импорт: манифест читается пачками по batch_size строк,
+    картинки пачки кодируются параллельно в image_engine (не больше
+    workers одновременно), пачка вставляется одной транзакцией. Отдаёт
+    события {'row', 'error'}, {'batch', ...} и в конце {'summary': ...},
+    так что память не зависит от размера файла.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    rows_total = imported = failed = batches = 0
+
+    rows = read_manifest(manifest, fmt)
+    limit = asyncio.Semaphore(workers)
+
+    with zipfile.ZipFile(archive_path) as archive, ThreadPoolExecutor(max_workers=workers) as pool:
+        archive_names = set(archive.namelist())
+
+        while True:
+            batch = await loop.run_in_executor(pool, lambda: list(islice(rows, batch_size)))
+            if not batch:
+                break
+
+            batches += 1
+            rows_total += len(batch)
+
+            valid = []
+            for line_no, row in batch:
+                data, error = validate_row(row, archive_names)
+                if error:
+                    failed += 1
+                    yield {'row': line_no, 'error': error}
+                else:
+                    valid.append((line_no, data))
+
+            converted = await asyncio.gather(
+                *[
+                    convert_archive_image(archive, data.image, pool, limit)
+                    for _, data in valid
+                ],
+                return_exceptions=True
+            )
+
+            products, media, refs, lines = [], {}, Counter(), []
+            sources = {}
+            for (line_no, data), result in zip(valid, converted):
+                if isinstance(result, Exception):
+                    failed += 1
+                    yield {'row': line_no, 'error': f'Не удалось обработать изображение: {result}'}
+                    continue
+
+                digest, variants = result
+                products.append(Product(
+                    name=data.name,
+                    description=data.description,
+                    price=data.price,
+                    media=variants['original'],
+                    media_variants=variants,
+                    media_hash=digest
+                ))
+                media[digest] = variants
+                sources[digest] = data.image
+                refs[digest] += 1
+                lines.append(line_no)
+
+            if products:
+                try:
+                    async with async_session() as session:
+                        session.add_all(products)
+                        for digest, count in refs.items():
+                            # Если файлы пропали, картинка перечитывается из архива
+                            await acquire_media(
+                                session, digest, media[digest],
+                                partial(_read_archive_bytes, archive, sources[digest]),
+                                count, wait=True
+                            )
+                        await increment_counter(session, PRODUCTS_COUNTER, len(products))
+                        await increment_counter(session, CATALOG_VERSION_COUNTER)
+                        await session.commit()
+                except Exception as e:
+                    # Закодированные картинки без ссылок уберёт media_gc
+                    for line_no in lines:
+                        failed += 1
+                        yield {'row': line_no, 'error': f'Ошибка записи в базу: {e}'}
+                else:
+                    imported += len(products)
+                    await invalidate_restored_products(session)
+                    await product_cache.invalidate_tag(PRODUCT_LIST_TAG)
+
+            yield {'batch': batches, 'rows': rows_total, 'imported': imported, 'failed': failed}
+
+    elapsed = time.monotonic() - started
+    yield {
+        'summary': {
+            'rows': rows_total,
+            'imported': imported,
+            'failed': failed,
+            'batches': batches,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(rows_total / elapsed, 1) if elapsed else None,
+        }
+    }
@@ -0,0 +1,31 @@
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(values: dict) -> str:
+    """Упаковывает ключ последней записи страницы в непрозрачный курсор"""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Распаковывает курсор, полученный от клиента в параметре after"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, binascii.Error, UnicodeError):
+        values = None
+
+    if not isinstance(values, dict) or not isinstance(values.get('id'), int):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                'type': 'error',
+                'msg': 'Некорректный курсор пагинации.'
+            }
+        )
+
+    return values
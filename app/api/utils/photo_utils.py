@@ -1,13 +1,42 @@
+import io
 import os
-import asyncio
+import hashlib
 from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from uuid import uuid4
 
-from PIL import Image
-from fastapi import HTTPException
+from PIL import Image, ImageOps, UnidentifiedImageError
+from dotenv import load_dotenv
+from fastapi import HTTPException, UploadFile, status
+
+
+load_dotenv()
+UPLOAD_DIR = os.getenv('UPLOAD_DIR')
+MAX_FILE_SIZE_MB = int(os.getenv('MAX_FILE_SIZE_MB', 25))
+# Защита от decompression bomb: маленький файл с огромным холстом
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', 40_000_000))
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
+# Сигнатура в начале файла -> формат
+IMAGE_SIGNATURES = {
+    b'\xff\xd8\xff': 'jpeg',
+    b'\x89PNG\r\n\x1a\n': 'png',
+    b'GIF87a': 'gif',
+    b'GIF89a': 'gif',
+}
+# Заголовок ищется в первых байтах; у JPEG с большим EXIF размеры дальше
+UPLOAD_SNIFF_CHUNK = 64 * 1024
+UPLOAD_SNIFF_MAX_BYTES = 1024 * 1024
+# Ширины уменьшенных копий; оригинал сохраняется всегда
+MEDIA_VARIANT_WIDTHS = sorted(
+    int(width) for width in os.getenv('MEDIA_VARIANT_WIDTHS', '200, 480, 960').split(',') if width.strip()
+)
+# Качество WebP оригиналов и копий, а также JPEG-копий /files?fmt=jpeg
+MEDIA_WEBP_QUALITY = int(os.getenv('MEDIA_WEBP_QUALITY', 80))
 
 
 async def validate_file_extension_async(filename: str):
-    ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
     ext = os.path.splitext(filename)[-1].lower()
     if ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(
@@ -19,21 +48,263 @@ async def validate_file_extension_async(filename: str):
         )
 
 
-async def convert_to_webp_async(file_path: str) -> str:
-    def convert():
-        with Image.open(file_path) as img:
-            img = img.convert("RGB")
-            webp_path = file_path.rsplit(".", 1)[0] + ".webp"
-            img.save(webp_path, "WEBP", optimize=True, quality=80)
+def sniff_image_format(head: bytes) -> Optional[str]:
+    for signature, fmt in IMAGE_SIGNATURES.items():
+        if head.startswith(signature):
+            return fmt
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def image_header_size(head: bytes) -> Optional[tuple]:
+    """
+    Размеры холста по началу файла, без декодирования пикселей. None —
+    заголовок прочитан не целиком. ValueError — холст больше MAX_IMAGE_PIXELS.
+    """
+    try:
+        with Image.open(io.BytesIO(head)) as img:
+            size = img.size
+    except Image.DecompressionBombError:
+        raise ValueError(f'Изображение больше {MAX_IMAGE_PIXELS} пикселей.')
+    except (UnidentifiedImageError, OSError, SyntaxError, EOFError):
+        return None
+
+    if size[0] * size[1] > MAX_IMAGE_PIXELS:
+        raise ValueError(f'Изображение больше {MAX_IMAGE_PIXELS} пикселей.')
+
+    return size
+
+
+def inspect_image(data: bytes) -> str:
+    """Проверка уже прочитанного файла (импорт): формат или ValueError"""
+    fmt = sniff_image_format(data[:16])
+    if fmt is None:
+        raise ValueError('Файл не является изображением JPEG, PNG, GIF или WebP.')
+    if image_header_size(data[:UPLOAD_SNIFF_MAX_BYTES]) is None:
+        raise ValueError('Не удалось прочитать заголовок изображения.')
+    return fmt
+
+
+async def read_image_upload(photo: UploadFile) -> tuple:
+    """
+    Читает загрузку в память, проверяя её по ходу: сигнатура и размеры
+    холста — по первым килобайтам, объём — на каждом чанке. Неподходящий
+    файл отклоняется до чтения остального. Заодно считается sha256
+    для хранилища по содержимому. Возвращает (bytes, формат, хэш).
+    """
+    max_size = MAX_FILE_SIZE_MB * 1024 * 1024
+    if photo.size is not None and photo.size > max_size:
+        raise _upload_too_large(f'Файл больше {MAX_FILE_SIZE_MB} МБ.')
+
+    buffer = bytearray(await photo.read(UPLOAD_SNIFF_CHUNK))
+    digest = hashlib.sha256(buffer)
+
+    fmt = sniff_image_format(bytes(buffer[:16]))
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                'type': 'error',
+                'msg': 'Файл не является изображением JPEG, PNG, GIF или WebP.'
+            }
+        )
+
+    while True:
+        try:
+            size = image_header_size(bytes(buffer))
+        except ValueError as e:
+            raise _upload_too_large(str(e))
+        if size is not None or len(buffer) >= UPLOAD_SNIFF_MAX_BYTES:
+            break
+        chunk = await photo.read(UPLOAD_SNIFF_CHUNK)
+        if not chunk:
+            break
+        buffer += chunk
+        digest.update(chunk)
+
+    if size is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                'type': 'error',
+                'msg': 'Не удалось прочитать заголовок изображения.'
+            }
+        )
+
+    while chunk := await photo.read(1024 * 1024):
+        buffer += chunk
+        digest.update(chunk)
+        if len(buffer) > max_size:
+            raise _upload_too_large(f'Файл больше {MAX_FILE_SIZE_MB} МБ.')
+
+    return bytes(buffer), fmt, digest.hexdigest()
+
+
+def _upload_too_large(msg: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail={
+            'type': 'error',
+            'msg': msg
+        }
+    )
+
+
+def save_atomic(img: Image.Image, path: str, fmt: str, **params):
+    """Пишет во временный файл и переименовывает: читатель не увидит недописанный файл"""
+    tmp_path = f"{path}.{uuid4().hex}.tmp"
+    try:
+        img.save(tmp_path, fmt, **params)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_atomic(path: str, data: bytes):
+    """Как save_atomic, но для уже закодированных байт"""
+    tmp_path = f"{path}.{uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'wb') as out_file:
+            out_file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def variant_path(webp_path: str, width: int, tag: Optional[str] = None) -> str:
+    """file_storage/<имя>.webp -> file_storage/<имя>_w<ширина>[.<tag>].webp"""
+    base = webp_path.rsplit('.', 1)[0]
+    return f"{base}_w{width}.{tag}.webp" if tag else f"{base}_w{width}.webp"
+
+
+def save_webp_variants(source, webp_path: str, save_original: bool = True) -> dict:
+    """
+    Сохраняет оригинал в WebP и уменьшенные копии по MEDIA_VARIANT_WIDTHS.
+    Картинка декодируется один раз; ширины больше оригинала пропускаются,
+    а сам оригинал попадает в карту ещё и под своей шириной, чтобы srcset
+    был полным. Возвращает {"200": путь, ..., "1200": путь, "original": путь}.
+    save_original=False — только копии из source, а оригиналом в карте
+    считается уже лежащий webp_path (перекодирование, reencode_media.py).
+    В имени копии — начало sha256 её байт: копии отдаются как неизменные,
+    и перекодированная с другими настройками копия получает новый URL,
+    а не перезаписывает старый.
+    """
+    with Image.open(source) as img:
+        img = img.convert("RGB")
+        if save_original:
+            save_atomic(img, webp_path, "WEBP", optimize=True, quality=MEDIA_WEBP_QUALITY)
+
+        variants = {}
+        for width in MEDIA_VARIANT_WIDTHS:
+            if width >= img.width:
+                break
+            height = max(1, round(img.height * width / img.width))
+            buffer = io.BytesIO()
+            # reducing_gap: сначала быстрое уменьшение в целое число раз, потом LANCZOS
+            img.resize((width, height), Image.LANCZOS, reducing_gap=3.0).save(
+                buffer, "WEBP", optimize=True, quality=MEDIA_WEBP_QUALITY
+            )
+            data = buffer.getvalue()
+            path = variant_path(webp_path, width, hashlib.sha256(data).hexdigest()[:8])
+            write_atomic(path, data)
+            variants[str(width)] = path
+
+        variants[str(img.width)] = webp_path
+
+    variants['original'] = webp_path
+    return variants
+
+
+def reencode_original(source_path: str) -> tuple:
+    """
+    Перекодирует оригинал с текущим MEDIA_WEBP_QUALITY в новый файл по
+    адресу нового содержимого (reencode_media.py --reencode-original).
+    Старый файл не трогается: его URL кэшируется как неизменный. Копии
+    строятся из старого оригинала, без лишнего поколения потерь.
+    Возвращает (новый хэш, карта как у save_webp_variants).
+    """
+    with Image.open(source_path) as img:
+        buffer = io.BytesIO()
+        img.convert("RGB").save(buffer, "WEBP", optimize=True, quality=MEDIA_WEBP_QUALITY)
+    data = buffer.getvalue()
+    digest = hashlib.sha256(data).hexdigest()
+
+    webp_path = content_webp_path(digest)
+    os.makedirs(os.path.dirname(webp_path), exist_ok=True)
+    write_atomic(webp_path, data)
+
+    return digest, save_webp_variants(source_path, webp_path, save_original=False)
+
+
+def media_url(webp_path: str) -> str:
+    """Путь в file_storage -> значение Product.media, отдаваемое через /files"""
+    normalized_path = os.path.normpath(webp_path)
+
+    return normalized_path.replace('file_storage', 'files')
+
+
+def media_path(media: str) -> str:
+    """Обратно к media_url: Product.media -> путь в file_storage"""
+    normalized_path = os.path.normpath(media.replace('\\', '/'))
+
+    return normalized_path.replace('files', 'file_storage', 1)
+
+
+def render_derivative(source_path: str, target_path: str, width: int, height: int, fit: str, fmt: str):
+    """
+    Уменьшенная копия для /files/{name}?w=&h=. width/height могут быть 0 —
+    тогда сторона считается по пропорциям. fit="cover" обрезает до w x h,
+    "contain" вписывает в прямоугольник. Картинка не увеличивается.
+    """
+    with Image.open(source_path) as img:
+        img = img.convert("RGBA" if fmt == "png" else "RGB")
+
+        box_width = min(width or img.width, img.width)
+        box_height = min(height or img.height, img.height)
+
+        if fit == "cover" and width and height:
+            result = ImageOps.fit(img, (box_width, box_height), Image.LANCZOS)
+        else:
+            result = img.copy()
+            result.thumbnail((box_width, box_height), Image.LANCZOS, reducing_gap=3.0)
+
+        if fmt == "jpeg":
+            save_atomic(result, target_path, "JPEG", optimize=True, quality=MEDIA_WEBP_QUALITY, progressive=True)
+        elif fmt == "png":
+            save_atomic(result, target_path, "PNG", optimize=True)
+        else:
+            save_atomic(result, target_path, "WEBP", quality=MEDIA_WEBP_QUALITY)
+
+
+def media_variant_urls(variants: dict) -> dict:
+    return {name: media_url(path) for name, path in variants.items()}
+
+
+def content_webp_path(digest: str) -> str:
+    """Адрес по содержимому: file_storage/<2 символа хэша>/<хэш>.webp"""
+    return os.path.join(UPLOAD_DIR, digest[:2], f"{digest}.webp")
+
+
+def convert_file_to_webp(file_path: str, webp_path: str) -> dict:
+    """Файл на диске -> WebP с копиями; исходник удаляется. Возвращает ссылки"""
+    os.makedirs(os.path.dirname(webp_path), exist_ok=True)
+    variants = save_webp_variants(file_path, webp_path)
 
-        if not file_path.lower().endswith(".webp"):
-            try:
-                os.remove(file_path)
-            except OSError as e:
-                print(f"Не удалось удалить файл {file_path}: {e}")
+    if os.path.abspath(file_path) != os.path.abspath(webp_path):
+        try:
+            os.remove(file_path)
+        except OSError as e:
+            print(f"Не удалось удалить файл {file_path}: {e}")
 
-        normalized_path = os.path.normpath(webp_path)
+    return media_variant_urls(variants)
 
-        return normalized_path.replace('file_storage', 'files')
 
-    return await asyncio.get_event_loop().run_in_executor(None, convert)
+def convert_bytes_to_webp(data: bytes, webp_path: str) -> dict:
+    """Картинка из памяти -> WebP с копиями: на диск попадают только готовые файлы"""
+    os.makedirs(os.path.dirname(webp_path), exist_ok=True)
+    return media_variant_urls(save_webp_variants(io.BytesIO(data), webp_path))
@@ -0,0 +1,149 @@
+import os
+import asyncio
+
+from dotenv import load_dotenv
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import PRODUCT_LIST_TAG, product_cache, product_tag
+from app.core.counters import CATALOG_VERSION_COUNTER, increment_counter
+from db.models.product import Product
+from db.models.rating import Rating
+from db.session import async_session
+
+
+load_dotenv()
+RATING_RECONCILE_INTERVAL = int(os.getenv('RATING_RECONCILE_INTERVAL', 3600))
+RATING_RECONCILE_BATCH_SIZE = int(os.getenv('RATING_RECONCILE_BATCH_SIZE', 1000))
+
+RATING_HISTOGRAM_COLUMNS = [getattr(Product, f'rating_hist_{value}') for value in range(1, 6)]
+
+
+async def apply_rating_change(
+    session: AsyncSession,
+    product_id: int,
+    old_rating: int,
+    new_rating: int
+) -> bool:
+    """
+    Переносит изменение одной оценки (0 — оценки нет) в агрегаты товара.
+    Обновление идёт одним UPDATE в текущей транзакции, поэтому агрегаты
+    коммитятся вместе с самой оценкой. Возвращает False, если товара нет.
+    """
+    count_delta = int(new_rating > 0) - int(old_rating > 0)
+    sum_delta = new_rating - old_rating
+
+    new_count = Product.rating_count + count_delta
+    new_sum = Product.rating_sum + sum_delta
+
+    values = {
+        'rating_count': new_count,
+        'rating_sum': new_sum,
+        'rating_avg': case(
+            (new_count > 0, new_sum * 1.0 / new_count),
+            else_=0
+        ),
+        'version': Product.version + 1,
+    }
+
+    if old_rating:
+        column = getattr(Product, f'rating_hist_{old_rating}')
+        values[column.key] = column - 1
+
+    if new_rating:
+        column = getattr(Product, f'rating_hist_{new_rating}')
+        # При old_rating == new_rating гистограмма не меняется
+        values[column.key] = column + (0 if old_rating == new_rating else 1)
+
+    result = await session.execute(
+        update(Product)
+        .where(Product.id == product_id)
+        .values(**values)
+    )
+
+    return result.rowcount > 0
+
+
+async def reconcile_rating_batch(session: AsyncSession, after_id: int, limit: int) -> tuple[list[int], int]:
+    """
+    Сверяет агрегаты оценок товаров с id > after_id (не больше limit товаров)
+    с таблицей ratings и переписывает разошедшиеся. Возвращает id
+    исправленных товаров и последний просмотренный id (0 — товары кончились).
+    """
+    stored = (await session.execute(
+        select(Product.id, Product.rating_count, Product.rating_sum, *RATING_HISTOGRAM_COLUMNS)
+        .where(Product.id > after_id)
+        .order_by(Product.id)
+        .limit(limit)
+    )).all()
+    if not stored:
+        return [], 0
+
+    ids = [row.id for row in stored]
+    exact = {
+        row.product_id: row[1:]
+        for row in await session.execute(
+            select(
+                Rating.product_id,
+                func.count(),
+                func.sum(Rating.rating),
+                *(func.sum(case((Rating.rating == value, 1), else_=0)) for value in range(1, 6))
+            )
+            .where(Rating.product_id.in_(ids))
+            .group_by(Rating.product_id)
+        )
+    }
+
+    fixed = []
+    for row in stored:
+        count, total, *histogram = exact.get(row.id, (0, 0, 0, 0, 0, 0, 0))
+        if tuple(row[1:]) == (count, total, *histogram):
+            continue
+
+        await session.execute(
+            update(Product)
+            .where(Product.id == row.id)
+            .values(
+                rating_count=count,
+                rating_sum=total,
+                rating_avg=total / count if count else 0,
+                version=Product.version + 1,
+                **{column.key: value for column, value in zip(RATING_HISTOGRAM_COLUMNS, histogram)}
+            )
+        )
+        fixed.append(row.id)
+
+    return fixed, ids[-1]
+
+
+async def reconcile_ratings(batch_size: int = RATING_RECONCILE_BATCH_SIZE) -> int:
+    """Проходит весь каталог пачками, каждая пачка — своя транзакция"""
+    after_id = 0
+    fixed_total = 0
+    while True:
+        async with async_session() as session:
+            fixed, after_id = await reconcile_rating_batch(session, after_id, batch_size)
+            if fixed:
+                await increment_counter(session, CATALOG_VERSION_COUNTER)
+            await session.commit()
+
+        for product_id in fixed:
+            await product_cache.invalidate_tag(product_tag(product_id))
+        if fixed:
+            await product_cache.invalidate_tag(PRODUCT_LIST_TAG)
+        fixed_total += len(fixed)
+
+        if not after_id:
+            return fixed_total
+
+
+async def run_ratings_reconciliation(interval: int = RATING_RECONCILE_INTERVAL):
+    """Периодически исправляет дрейф агрегатов оценок, запускается из lifespan"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            fixed = await reconcile_ratings()
+            if fixed:
+                print(f"Исправлены агрегаты оценок у товаров: {fixed}")
+        except Exception as e:
+            print(f"Не удалось сверить агрегаты оценок: {e}")
@@ -0,0 +1,55 @@
+import re
+
+from fastapi import HTTPException, status
+from sqlalchemy import column, select, table, text
+
+from db.models.product import Product
+
+
+# FTS5-таблица из миграции 301e0baa160a, rank — встроенный bm25
+products_fts = table('products_fts', column('rowid'), column('rank'))
+
+SEARCH_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_SEARCH_TOKENS = 8
+
+
+def tokenize_search_query(q: str) -> list[str]:
+    """Оставляет только слова, чтобы пользовательский ввод не попадал в синтаксис MATCH/tsquery"""
+    return SEARCH_TOKEN_RE.findall(q.lower())[:MAX_SEARCH_TOKENS]
+
+
+def build_search_query(dialect: str, tokens: list[str]) -> tuple:
+    """
+    Собирает запрос поиска по name/description для текущей СУБД.
+    Каждое слово ищется по префиксу, все слова должны встретиться.
+    Возвращает (statement, params).
+    """
+    if dialect == 'sqlite':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        statement = (
+            select(Product)
+            .join(products_fts, products_fts.c.rowid == Product.id)
+            .where(text('products_fts MATCH :match'))
+            .order_by(products_fts.c.rank)
+        )
+        return statement, {'match': match}
+
+    if dialect == 'postgresql':
+        match = ' & '.join(f'{token}:*' for token in tokens)
+        statement = (
+            select(Product)
+            .where(text("products.search_vector @@ to_tsquery('simple', :match)"))
+            .order_by(
+                text("ts_rank(products.search_vector, to_tsquery('simple', :match)) DESC"),
+                Product.id
+            )
+        )
+        return statement, {'match': match}
+
+    raise HTTPException(
+        status_code=status.HTTP_501_NOT_IMPLEMENTED,
+        detail={
+            'type': 'error',
+            'msg': 'Поиск не поддерживается для этой базы данных.'
+        }
+    )
@@ -0,0 +1,235 @@
+import os
+import time
+import asyncio
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Any, Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+
+from app.core.coalesce import SingleFlight
+from app.core.metrics import register_metrics
+
+
+load_dotenv()
+PRODUCT_CACHE_TTL = float(os.getenv('PRODUCT_CACHE_TTL', 30))
+PRODUCT_CACHE_STALE_TTL = float(os.getenv('PRODUCT_CACHE_STALE_TTL', 300))
+PRODUCT_CACHE_MAX_ENTRIES = int(os.getenv('PRODUCT_CACHE_MAX_ENTRIES', 1024))
+
+PRODUCT_LIST_TAG = 'products:list'
+
+
+def product_tag(product_id: int) -> str:
+    return f'products:{product_id}'
+
+
+def make_cache_key(route: str, **params) -> str:
+    """Ключ вида route?a=1&b=2, параметры отсортированы, None пропускаются"""
+    query = '&'.join(
+        f'{name}={value}'
+        for name, value in sorted(params.items())
+        if value is not None
+    )
+    return f'{route}?{query}'
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    value: Any
+    fresh_until: float
+    stale_until: float
+    tags: tuple = ()
+
+
+class CacheBackend(ABC):
+    """Хранилище записей кэша. Интерфейс асинхронный, чтобы за ним мог стоять Redis и т.п."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, entry: CacheEntry):
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    async def keys_for_tag(self, tag: str) -> list[str]:
+        ...
+
+
+class MemoryCacheBackend(CacheBackend):
+    """LRU в памяти процесса, ограниченный числом записей"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._tags: dict[str, set[str]] = {}
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if entry.stale_until < time.monotonic():
+            self._remove(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: CacheEntry):
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = entry
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    async def delete(self, key: str):
+        self._remove(key)
+
+    async def keys_for_tag(self, tag: str) -> list[str]:
+        return list(self._tags.get(tag, ()))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class ResponseCache:
+    """
+    Кэш ответов с TTL и stale-while-revalidate: после ttl запись ещё
+    stale_ttl секунд отдаётся как есть, а обновляет её одна фоновая задача.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float, stale_ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.flight = SingleFlight()
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self._invalidations = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        tags: tuple = ()
+    ) -> Any:
+        entry = await self.backend.get(key)
+
+        if entry is not None:
+            if entry.fresh_until <= time.monotonic():
+                self.stale_hits += 1
+                self._schedule_refresh(key, loader, tags)
+            else:
+                self.hits += 1
+            return entry.value
+
+        # Одновременные промахи по одному ключу ждут одну загрузку
+        self.misses += 1
+        return await self.flight.do(key, lambda: self._load(key, loader, tags))
+
+    async def peek(self, key: str) -> Optional[Any]:
+        """Свежее значение без загрузки и фонового обновления"""
+        entry = await self.backend.get(key)
+        if entry is None or entry.fresh_until <= time.monotonic():
+            return None
+        return entry.value
+
+    async def invalidate(self, key: str, hard: bool = False):
+        """
+        hard=True удаляет запись. Иначе запись помечается устаревшей:
+        её продолжат отдавать, пока одна фоновая задача перечитывает данные.
+        """
+        self._invalidations += 1
+
+        if hard:
+            await self.backend.delete(key)
+            return
+
+        entry = await self.backend.get(key)
+        if entry is not None:
+            await self.backend.set(key, replace(entry, fresh_until=0))
+
+    async def invalidate_tag(self, tag: str, hard: bool = False):
+        for key in await self.backend.keys_for_tag(tag):
+            await self.invalidate(key, hard=hard)
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'queries_executed': self.flight.executed,
+            'queries_coalesced': self.flight.coalesced,
+            'queries_inflight': self.flight.stats()['inflight'],
+        }
+
+    async def _load(self, key: str, loader, tags: tuple) -> Any:
+        invalidations = self._invalidations
+        value = await loader()
+
+        now = time.monotonic()
+        fresh_until = now + self.ttl
+        # Пока грузили, могла пройти запись в БД — такой результат
+        # сохраняем сразу устаревшим, чтобы его перечитали
+        if invalidations != self._invalidations:
+            fresh_until = 0
+
+        await self.backend.set(
+            key,
+            CacheEntry(
+                value=value,
+                fresh_until=fresh_until,
+                stale_until=now + self.ttl + self.stale_ttl,
+                tags=tuple(tags)
+            )
+        )
+        return value
+
+    def _schedule_refresh(self, key: str, loader, tags: tuple):
+        if key in self._refreshing:
+            return
+        self._refreshing[key] = asyncio.create_task(self._refresh(key, loader, tags))
+
+    async def _refresh(self, key: str, loader, tags: tuple):
+        try:
+            await self.flight.do(key, lambda: self._load(key, loader, tags))
+        except Exception:
+            # Например, товар удалили — устаревшую запись больше не отдаём
+            await self.backend.delete(key)
+        finally:
+            self._refreshing.pop(key, None)
+
+
+product_cache = ResponseCache(
+    backend=MemoryCacheBackend(max_entries=PRODUCT_CACHE_MAX_ENTRIES),
+    ttl=PRODUCT_CACHE_TTL,
+    stale_ttl=PRODUCT_CACHE_STALE_TTL
+)
+
+register_metrics('product_cache', product_cache.stats)
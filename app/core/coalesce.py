@@ -0,0 +1,44 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные одинаковые запросы: пока по ключу идёт
+    загрузка, остальные вызовы ждут её результат, а не идут в БД сами.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.executed += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+
+        # shield: отмена одного ожидающего (клиент отвалился) не отменяет
+        # загрузку для остальных
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'inflight': len(self._inflight),
+        }
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+        # Забираем исключение, даже если все ожидающие уже отменены
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,109 @@
+import os
+import asyncio
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import Counter, Product
+from db.session import async_session
+
+
+load_dotenv()
+COUNTER_RECONCILE_INTERVAL = int(os.getenv('COUNTER_RECONCILE_INTERVAL', 300))
+
+PRODUCTS_COUNTER = 'products'
+# Растёт при любом изменении каталога, из него строится ETag листинга
+CATALOG_VERSION_COUNTER = 'catalog_version'
+
+# Счётчик -> таблица, по которой он сверяется
+RECONCILED_COUNTERS = {
+    PRODUCTS_COUNTER: Product.__table__,
+}
+
+
+async def get_counter(session: AsyncSession, name: str) -> Optional[int]:
+    return await session.scalar(select(Counter.value).where(Counter.name == name))
+
+
+async def get_counter_row(session: AsyncSession, name: str):
+    """Значение счётчика вместе со временем последнего изменения"""
+    result = await session.execute(
+        select(Counter.value, Counter.updated_at).where(Counter.name == name)
+    )
+    return result.first()
+
+
+async def increment_counter(session: AsyncSession, name: str, delta: int = 1):
+    """Меняет счётчик в текущей транзакции, коммит остаётся за вызывающим кодом"""
+    await session.execute(
+        update(Counter)
+        .where(Counter.name == name)
+        .values(value=Counter.value + delta)
+    )
+
+
+async def reconcile_counter(session: AsyncSession, name: str, table) -> int:
+    """Выставляет счётчику точное значение COUNT(*) одной командой"""
+    exact = select(func.count()).select_from(table)
+    result = await session.execute(
+        update(Counter)
+        .where(Counter.name == name)
+        .values(value=exact.scalar_subquery())
+    )
+
+    if result.rowcount == 0:
+        session.add(Counter(name=name, value=await session.scalar(exact)))
+
+    await session.flush()
+    return await get_counter(session, name)
+
+
+async def estimate_row_count(session: AsyncSession, table_name: str) -> Optional[int]:
+    """Оценка числа строк из статистики СУБД, без обхода таблицы"""
+    dialect = session.bind.dialect.name
+
+    if dialect == 'postgresql':
+        estimate = await session.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"),
+            {'table': table_name}
+        )
+        # -1 — таблица ещё ни разу не анализировалась
+        if estimate is None or estimate < 0:
+            return None
+        return estimate
+
+    if dialect == 'sqlite':
+        has_stats = await session.scalar(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+        )
+        if not has_stats:
+            return None
+
+        stat = await session.scalar(
+            text("SELECT stat FROM sqlite_stat1 WHERE tbl = :table LIMIT 1"),
+            {'table': table_name}
+        )
+        if not stat:
+            return None
+        return int(stat.split()[0])
+
+    return None
+
+
+async def reconcile_counters():
+    async with async_session() as session:
+        for name, table in RECONCILED_COUNTERS.items():
+            await reconcile_counter(session, name, table)
+        await session.commit()
+
+
+async def run_counters_reconciliation(interval: int = COUNTER_RECONCILE_INTERVAL):
+    """Периодически исправляет дрейф счётчиков, запускается из lifespan"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile_counters()
+        except Exception as e:
+            print(f"Не удалось сверить счётчики: {e}")
@@ -0,0 +1,150 @@
+import os
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable
+from uuid import uuid4
+
+from dotenv import load_dotenv
+
+from app.core.coalesce import SingleFlight
+from app.core.metrics import register_metrics
+
+
+load_dotenv()
+DERIVATIVE_CACHE_DIR = os.getenv('DERIVATIVE_CACHE_DIR', 'derivative_cache')
+DERIVATIVE_CACHE_MAX_MB = int(os.getenv('DERIVATIVE_CACHE_MAX_MB', 512))
+
+
+class DerivativeCache:
+    """
+    Дисковый кэш уменьшенных копий с вытеснением LRU по суммарному размеру.
+    Порядок использования хранится в памяти; при старте восстанавливается
+    по mtime файлов. Одинаковые промахи объединяются через SingleFlight.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.flight = SingleFlight()
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, name: str, render: Callable[[str], Awaitable[None]]) -> str:
+        """
+        Путь к готовой копии name. При промахе ждёт render(временный путь)
+        и переименовывает результат, так что файл появляется атомарно.
+        """
+        await self._ensure_loaded()
+
+        path = os.path.join(self.directory, name)
+        if name in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(name)
+            return path
+
+        self.misses += 1
+        return await self.flight.do(name, lambda: self._build(name, path, render))
+
+    def forget(self, name: str):
+        """Убирает запись, если файл исчез с диска в обход кэша"""
+        size = self._entries.pop(name, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+        }
+
+    async def _build(self, name: str, path: str, render: Callable[[str], Awaitable[None]]) -> str:
+        loop = asyncio.get_running_loop()
+        tmp_path = f"{path}.{uuid4().hex}.tmp"
+
+        try:
+            await render(tmp_path)
+        except BaseException:
+            await loop.run_in_executor(None, _remove_files, [tmp_path])
+            raise
+
+        def publish() -> int:
+            os.replace(tmp_path, path)
+            return os.path.getsize(path)
+
+        size = await loop.run_in_executor(None, publish)
+
+        self.forget(name)
+        self._entries[name] = size
+        self._total_bytes += size
+
+        evicted = self._evict(keep=name)
+        if evicted:
+            await loop.run_in_executor(None, _remove_files, evicted)
+
+        return path
+
+    def _evict(self, keep: str) -> list:
+        evicted = []
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = next(iter(self._entries.items()))
+            if name == keep:
+                break
+            del self._entries[name]
+            self._total_bytes -= size
+            self.evictions += 1
+            evicted.append(os.path.join(self.directory, name))
+        return evicted
+
+    async def _ensure_loaded(self):
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            entries = await asyncio.get_running_loop().run_in_executor(None, self._scan)
+            for name, size in entries:
+                self._entries[name] = size
+                self._total_bytes += size
+            self._loaded = True
+
+    def _scan(self) -> list:
+        os.makedirs(self.directory, exist_ok=True)
+
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith('.tmp'):
+                # Остатки оборванной отрисовки
+                _remove_files([entry.path])
+                continue
+            stat_result = entry.stat()
+            entries.append((stat_result.st_mtime, entry.name, stat_result.st_size))
+
+        entries.sort()
+        return [(name, size) for _, name, size in entries]
+
+
+def _remove_files(paths: list):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+derivative_cache = DerivativeCache(
+    directory=DERIVATIVE_CACHE_DIR,
+    max_bytes=DERIVATIVE_CACHE_MAX_MB * 1024 * 1024
+)
+
+register_metrics('derivative_cache', derivative_cache.stats)
@@ -0,0 +1,246 @@
+import os
+import time
+import asyncio
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+
+from app.core.metrics import register_metrics
+
+
+load_dotenv()
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', os.cpu_count() or 2))
+IMAGE_QUEUE_SIZE = int(os.getenv('IMAGE_QUEUE_SIZE', 32))
+IMAGE_JOB_TIMEOUT = float(os.getenv('IMAGE_JOB_TIMEOUT', 30))
+
+LATENCY_WINDOW = 1024
+
+
+class ImageEngineBusy(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={
+                'type': 'error',
+                'msg': 'Сервер занят обработкой изображений, повторите запрос позже.'
+            },
+            headers={'Retry-After': '1'}
+        )
+
+
+class ImageJobTimeout(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={
+                'type': 'error',
+                'msg': 'Обработка изображения заняла слишком много времени.'
+            }
+        )
+
+
+def _timed_call(fn: Callable, args: tuple, kwargs: dict) -> tuple:
+    """Выполняется в процессе-воркере: результат и чистое время кодирования"""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+class ImageEngine:
+    """
+    Пул процессов для Pillow: кодирование не держит GIL основного процесса
+    и не занимает его потоки. Число задач в работе и в очереди ограничено
+    max_pending — сверх этого run() сразу отвечает 503 (ImageEngineBusy).
+    В пул отдаётся не больше workers задач, остальные ждут здесь, поэтому
+    timeout отсчитывается с момента, когда задачу взял свободный воркер, а
+    не с постановки в очередь. Задача, превысившая timeout, возвращает
+    ошибку вызывающему, но её воркер и слот освобождаются только когда
+    она действительно закончится.
+    """
+
+    def __init__(self, workers: int, max_pending: int, timeout: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._running = 0
+        self._queued = 0
+        self._state_changed: Optional[asyncio.Condition] = None
+        self._state_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue_times = deque(maxlen=LATENCY_WINDOW)
+        self._encode_times = deque(maxlen=LATENCY_WINDOW)
+        self._total_times = deque(maxlen=LATENCY_WINDOW)
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    async def run(self, fn: Callable, *args, wait: bool = False, **kwargs) -> Any:
+        """
+        Выполняет fn(*args, **kwargs) в пуле. fn и аргументы должны
+        сериализоваться pickle. wait=True — ждать свободного места в очереди
+        вместо отказа (для фоновых пакетных задач).
+        """
+        if self._pending >= self.max_pending:
+            if not wait:
+                self.rejected += 1
+                raise ImageEngineBusy()
+            await self._wait_until(lambda: self._pending < self.max_pending)
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+
+        self._pending += 1
+        try:
+            await self._acquire_worker()
+        except BaseException:
+            # Отменили, пока задача ждала воркера, — в пул она не попала
+            self._pending -= 1
+            self._notify()
+            raise
+        self._queue_times.append(time.perf_counter() - started)
+
+        try:
+            job = self._get_executor().submit(_timed_call, fn, args, kwargs)
+        except BaseException:
+            self._running -= 1
+            self._pending -= 1
+            self.failed += 1
+            self._notify()
+            raise
+        job.add_done_callback(lambda done: _call_in_loop(loop, self._release, done))
+
+        try:
+            # Воркер свободен, задача начинается сразу: timeout — чистое время работы
+            result, encode_time = await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(job)),
+                timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise ImageJobTimeout()
+        except BrokenProcessPool:
+            # Воркер упал (OOM, segfault в декодере) — следующая задача
+            # получит новый пул
+            self._reset_executor()
+            raise
+
+        self._encode_times.append(encode_time)
+        self._total_times.append(time.perf_counter() - started)
+        return result
+
+    async def warm_up(self):
+        """
+        Запускает воркеры заранее: spawn занимает секунды, и без прогрева
+        первые загрузки после старта упирались бы в timeout.
+        """
+        executor = self._get_executor()
+        jobs = [executor.submit(os.getpid) for _ in range(self.workers)]
+        await asyncio.gather(*(asyncio.wrap_future(job) for job in jobs))
+
+    def shutdown(self):
+        self._reset_executor()
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'running': self._running,
+            'queue_depth': self._pending - self._running,
+            'max_pending': self.max_pending,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'queue_ms': _latency_summary(self._queue_times),
+            'encode_ms': _latency_summary(self._encode_times),
+            'total_ms': _latency_summary(self._total_times),
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: не наследуем потоки и состояние event loop родителя
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def _reset_executor(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _acquire_worker(self):
+        # Без ожидающих сразу занимаем свободный воркер, иначе встаём в
+        # очередь за ними (Condition будит ждущих по порядку)
+        if not self._queued and self._running < self.workers:
+            self._running += 1
+            return
+
+        self._queued += 1
+        try:
+            await self._wait_until(lambda: self._running < self.workers)
+            self._running += 1
+        finally:
+            self._queued -= 1
+
+    def _release(self, job: Future):
+        self._running -= 1
+        self._pending -= 1
+        if job.cancelled() or job.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+        self._notify()
+
+    def _notify(self):
+        if self._state_changed is not None and self._state_loop is asyncio.get_running_loop():
+            asyncio.ensure_future(self._notify_state_changed())
+
+    async def _notify_state_changed(self):
+        async with self._state_changed:
+            self._state_changed.notify_all()
+
+    async def _wait_until(self, predicate: Callable[[], bool]):
+        # Condition привязывается к event loop, а движок живёт дольше
+        # одного loop (тесты, CLI) — пересоздаём при смене loop
+        loop = asyncio.get_running_loop()
+        if self._state_changed is None or self._state_loop is not loop:
+            self._state_changed = asyncio.Condition()
+            self._state_loop = loop
+        async with self._state_changed:
+            await self._state_changed.wait_for(predicate)
+
+
+def _call_in_loop(loop: asyncio.AbstractEventLoop, callback: Callable, *args):
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+    except RuntimeError:
+        # loop уже закрыт (остановка приложения) — считать некому
+        pass
+
+
+def _latency_summary(samples: deque) -> dict:
+    if not samples:
+        return {'avg': None, 'p95': None, 'max': None}
+    ordered = sorted(samples)
+    return {
+        'avg': round(sum(ordered) / len(ordered) * 1000, 2),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+        'max': round(ordered[-1] * 1000, 2),
+    }
+
+
+image_engine = ImageEngine(
+    workers=IMAGE_WORKERS,
+    max_pending=IMAGE_QUEUE_SIZE,
+    timeout=IMAGE_JOB_TIMEOUT
+)
+
+register_metrics('image_engine', image_engine.stats)
@@ -1,15 +1,23 @@
 import os
+import time
+import hashlib
+from collections import OrderedDict
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 import jwt
 
+from app.core.metrics import register_metrics
+
 
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(
     os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 10080))
+# Сколько проверенных токенов держать в памяти (0 — не кэшировать)
+JWT_CACHE_MAX_ENTRIES = int(os.getenv("JWT_CACHE_MAX_ENTRIES", 10000))
 
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -22,11 +30,82 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return token
 
 
-def verify_access_token(token: str):
+def decode_access_token(token: str) -> Optional[dict]:
+    """Полная проверка подписи и claims, без кэша"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except jwt.ExpiredSignatureError:
         return None
-    except jwt.InvalidTokenError as e:
+    except jwt.InvalidTokenError:
         return None
+
+
+class TokenCache:
+    """
+    LRU уже проверенных токенов: sha256 токена -> (payload, exp). Запись
+    живёт до exp самого токена, поэтому просроченный токен отклоняется так
+    же, как без кэша. Неверные токены не кэшируются: иначе поток мусорных
+    cookie вытеснял бы настоящие.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[bytes, tuple] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.rejected = 0
+
+    def verify(self, token: str) -> Optional[dict]:
+        if self.max_entries <= 0:
+            return decode_access_token(token)
+
+        key = hashlib.sha256(token.encode()).digest()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                # Копия: вызывающий код не должен менять закэшированный payload
+                return dict(entry[0])
+            del self._entries[key]
+            self.expired += 1
+            return None
+
+        self.misses += 1
+        payload = decode_access_token(token)
+        if payload is None:
+            self.rejected += 1
+            return None
+
+        exp = payload.get('exp')
+        if isinstance(exp, (int, float)):
+            self._entries[key] = (payload, exp)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return dict(payload)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'max_entries': self.max_entries,
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'expired': self.expired,
+            'rejected': self.rejected,
+        }
+
+
+token_cache = TokenCache(JWT_CACHE_MAX_ENTRIES)
+
+register_metrics('jwt_cache', token_cache.stats)
+
+
+def verify_access_token(token: str):
+    return token_cache.verify(token)
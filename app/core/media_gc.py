@@ -0,0 +1,247 @@
+import os
+import re
+import time
+import shutil
+import asyncio
+from itertools import islice
+from typing import Iterator, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from app.api.utils.photo_utils import media_url
+from app.core.metrics import register_metrics
+from db.models import MediaBlob, MediaJob, Product
+from db.session import async_session
+
+
+load_dotenv()
+UPLOAD_DIR = os.getenv('UPLOAD_DIR')
+# Раз в сколько секунд lifespan запускает сборку; 0 — не запускать
+MEDIA_GC_INTERVAL = int(os.getenv('MEDIA_GC_INTERVAL', 24 * 60 * 60))
+# Файлы моложе этого не трогаются: их может ещё писать загрузка или импорт
+MEDIA_GC_GRACE_HOURS = float(os.getenv('MEDIA_GC_GRACE_HOURS', 24))
+MEDIA_GC_BATCH_SIZE = int(os.getenv('MEDIA_GC_BATCH_SIZE', 500))
+# Если задан, сироты переносятся сюда, а не удаляются
+MEDIA_GC_QUARANTINE_DIR = os.getenv('MEDIA_GC_QUARANTINE_DIR') or None
+
+# <имя>.webp, <имя>_w<ширина>.webp или <имя>_w<ширина>.<хэш копии>.webp
+WEBP_NAME = re.compile(r'^(?P<base>.+?)(?:_w\d+(?:\.[0-9a-f]{8})?)?\.webp$')
+CONTENT_HASH = re.compile(r'^[0-9a-f]{64}$')
+
+_stats = {
+    'runs': 0,
+    'last_run': None,
+}
+
+register_metrics('media_gc', lambda: dict(_stats))
+
+
+def walk_files(directory: str, skip: tuple = ()) -> Iterator[tuple]:
+    """
+    Обходит каталог через os.scandir, отдавая (путь, имя) по одному:
+    в памяти только стек ещё не пройденных подкаталогов.
+    """
+    skip = {os.path.abspath(path) for path in skip}
+    stack = [directory]
+    while stack:
+        root = stack.pop()
+        try:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if os.path.abspath(entry.path) not in skip:
+                            stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and not entry.name.startswith('.'):
+                        yield entry.path, entry.name
+        except OSError as e:
+            print(f"Не удалось прочитать каталог {root}: {e}")
+
+
+async def find_referenced(batch: list) -> set:
+    """
+    Пути из пачки, на которые ссылается база. Файл картинки занят, только
+    если он есть в карте ссылок: копии, которые reencode_media.py заменил
+    новыми, достаются сборщику.
+    """
+    hashes, legacy, sources = {}, {}, {}
+    for path, name in batch:
+        match = WEBP_NAME.match(name)
+        if match is None:
+            if not name.endswith('.tmp'):
+                # Исходник, который ждёт воркера (?background=true)
+                sources[path] = path
+            continue
+
+        base = match.group('base')
+        if CONTENT_HASH.match(base):
+            hashes.setdefault(base, []).append(path)
+        else:
+            # Старые файлы: ссылка на оригинал, в том числе с '\' из Windows
+            url = media_url(os.path.join(os.path.dirname(path), f"{base}.webp"))
+            for candidate in (url, url.replace('/', '\\')):
+                legacy.setdefault(candidate, []).append(path)
+
+    referenced = set()
+    async with async_session() as session:
+        if hashes:
+            for digest, variants in await session.execute(
+                select(MediaBlob.hash, MediaBlob.variants).where(MediaBlob.hash.in_(list(hashes)))
+            ):
+                referenced.update(_listed(hashes[digest], variants))
+        if legacy:
+            for media, variants in await session.execute(
+                select(Product.media, Product.media_variants).where(Product.media.in_(list(legacy)))
+            ):
+                # Товары до карты копий: все файлы с тем же именем заняты
+                referenced.update(_listed(legacy[media], variants) if variants else legacy[media])
+        if sources:
+            referenced.update(await session.scalars(
+                select(MediaJob.source_path)
+                .where(
+                    MediaJob.source_path.in_(list(sources)),
+                    MediaJob.status.in_(['pending', 'processing'])
+                )
+            ))
+
+    return referenced
+
+
+def dispose_orphans(paths: list, directory: str, cutoff: float, quarantine_dir: Optional[str], dry_run: bool) -> tuple:
+    """Удаляет (или переносит в карантин) файлы старше cutoff; возвращает (число, байты)"""
+    count = size = 0
+    for path in paths:
+        # mtime читается после сверки с базой: acquire_media обновляет его,
+        # когда заново берёт ссылку на картинку
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if stat.st_mtime > cutoff:
+            continue
+
+        try:
+            if dry_run:
+                pass
+            elif quarantine_dir:
+                target = os.path.join(quarantine_dir, os.path.relpath(path, directory))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+            else:
+                os.remove(path)
+        except OSError as e:
+            print(f"Не удалось убрать файл {path}: {e}")
+            continue
+
+        count += 1
+        size += stat.st_size
+
+    return count, size
+
+
+def prune_empty_dirs(directory: str, cutoff: float, skip: tuple = (), dry_run: bool = False) -> int:
+    """
+    Удаляет пустые каталоги-префиксы <xx>/ хранилища, не менявшиеся с
+    cutoff: свежий каталог могла только что создать загрузка. Каталог,
+    опустевший в этом запуске, уберётся в следующем.
+    """
+    skip = {os.path.abspath(path) for path in skip}
+    pruned = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False) or os.path.abspath(entry.path) in skip:
+                continue
+            try:
+                if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                    continue
+                if dry_run:
+                    if any(os.scandir(entry.path)):
+                        continue
+                else:
+                    # rmdir не удаляет непустой каталог
+                    os.rmdir(entry.path)
+            except OSError:
+                continue
+            pruned += 1
+
+    return pruned
+
+
+async def collect_orphaned_media(
+    directory: str = UPLOAD_DIR,
+    grace_hours: float = MEDIA_GC_GRACE_HOURS,
+    quarantine_dir: Optional[str] = MEDIA_GC_QUARANTINE_DIR,
+    batch_size: int = MEDIA_GC_BATCH_SIZE,
+    dry_run: bool = False
+) -> dict:
+    """
+    Ищет в file_storage файлы, на которые не ссылается ни один товар,
+    ни media_blobs, ни ждущая задача media_jobs, и удаляет их (или переносит
+    в quarantine_dir). Каталог читается потоком, сверка с базой — пачками
+    по batch_size, поэтому память не зависит от числа файлов. В конце
+    убираются опустевшие каталоги-префиксы.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    cutoff = time.time() - grace_hours * 60 * 60
+    scanned = orphaned = removed = reclaimed = 0
+
+    skip = (quarantine_dir,) if quarantine_dir else ()
+    files = walk_files(directory, skip=skip)
+    while True:
+        batch = await loop.run_in_executor(None, lambda: list(islice(files, batch_size)))
+        if not batch:
+            break
+
+        scanned += len(batch)
+        referenced = await find_referenced(batch)
+        orphans = [path for path, _ in batch if path not in referenced]
+        orphaned += len(orphans)
+
+        count, size = await loop.run_in_executor(
+            None, dispose_orphans, orphans, directory, cutoff, quarantine_dir, dry_run
+        )
+        removed += count
+        reclaimed += size
+
+    pruned = await loop.run_in_executor(None, prune_empty_dirs, directory, cutoff, skip, dry_run)
+
+    elapsed = time.monotonic() - started
+    # Сироты моложе grace_hours ждут следующего запуска
+    summary = {'scanned': scanned, 'orphaned': orphaned}
+    if dry_run:
+        # Ничего не удалено — только сколько было бы
+        summary.update(would_remove=removed, would_reclaim=reclaimed, would_prune_dirs=pruned)
+    else:
+        summary.update(removed=removed, bytes_reclaimed=reclaimed, pruned_dirs=pruned)
+    summary.update({
+        'mode': 'dry-run' if dry_run else 'quarantine' if quarantine_dir else 'delete',
+        'elapsed_seconds': round(elapsed, 3),
+        'files_per_second': round(scanned / elapsed, 1) if elapsed else None,
+    })
+
+    _stats['runs'] += 1
+    _stats['last_run'] = summary
+    return summary
+
+
+async def run_media_gc(interval: int = MEDIA_GC_INTERVAL):
+    """Периодическая сборка осиротевших картинок, запускается из lifespan"""
+    if interval <= 0:
+        return
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            summary = await collect_orphaned_media()
+        except Exception as e:
+            print(f"Не удалось убрать осиротевшие картинки: {e}")
+        else:
+            if summary['removed']:
+                print(f"Убрано осиротевших картинок: {summary['removed']}, {summary['bytes_reclaimed']} байт")
+
+
+def _listed(paths: list, variants: dict) -> list:
+    """Пути, имена которых есть среди ссылок карты"""
+    names = {os.path.basename(url.replace('\\', '/')) for url in variants.values()}
+    return [path for path in paths if os.path.basename(path) in names]
@@ -0,0 +1,312 @@
+import os
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import PRODUCT_LIST_TAG, product_cache, product_tag
+from app.core.counters import CATALOG_VERSION_COUNTER, increment_counter
+from app.core.media_store import acquire_media, ensure_media_files, invalidate_restored_products
+from app.core.metrics import register_metrics
+from db.models import MediaJob, Product
+from db.session import async_session
+
+
+load_dotenv()
+MEDIA_WORKER_CONCURRENCY = int(os.getenv('MEDIA_WORKER_CONCURRENCY', 2))
+MEDIA_WORKER_POLL_INTERVAL = float(os.getenv('MEDIA_WORKER_POLL_INTERVAL', 5))
+MEDIA_JOB_MAX_ATTEMPTS = int(os.getenv('MEDIA_JOB_MAX_ATTEMPTS', 3))
+# Аренда задачи воркером; пока задача в работе, аренда продлевается
+MEDIA_JOB_LEASE_SECONDS = float(os.getenv('MEDIA_JOB_LEASE_SECONDS', 300))
+
+# Будит воркер сразу после постановки задачи, не дожидаясь опроса
+media_jobs_wakeup = asyncio.Event()
+
+_stats = {
+    'processed': 0,
+    'failed': 0,
+    'retried': 0,
+    'expired': 0,
+}
+
+register_metrics('media_jobs', lambda: dict(_stats))
+
+
+async def enqueue_media_job(session: AsyncSession, product: Product, source_path: str) -> MediaJob:
+    """
+    Ставит конвертацию картинки товара в очередь в той же транзакции,
+    что и сам товар. Вызывающий коммитит и затем дёргает media_jobs_wakeup.
+    """
+    product.media = ''
+    product.media_status = 'pending'
+    session.add(product)
+    await session.flush()
+
+    job = MediaJob(product_id=product.id, source_path=source_path)
+    session.add(job)
+    await session.flush()
+    return job
+
+
+async def claim_media_jobs(limit: int) -> list:
+    """
+    Забирает до limit задач в работу. Захват — условный UPDATE по статусу,
+    поэтому одну задачу не возьмут два воркера. Номер попытки служит
+    токеном владения: воркер, у которого задачу забрали по истёкшей аренде,
+    уже не сможет её завершить.
+    """
+    async with async_session() as session:
+        candidates = (await session.execute(
+            select(MediaJob.id, MediaJob.product_id, MediaJob.source_path, MediaJob.attempts)
+            .where(MediaJob.status == 'pending')
+            .order_by(MediaJob.id)
+            .limit(limit)
+        )).all()
+
+        claimed = []
+        for job in candidates:
+            result = await session.execute(
+                update(MediaJob)
+                .where(MediaJob.id == job.id, MediaJob.status == 'pending')
+                .values(status='processing', attempts=MediaJob.attempts + 1, lease_until=_lease_deadline())
+            )
+            if result.rowcount:
+                claimed.append((job.id, job.product_id, job.source_path, job.attempts + 1))
+
+        await session.commit()
+        return claimed
+
+
+async def process_media_job(job_id: int, product_id: int, source_path: str, attempts: int):
+    try:
+        async with async_session() as session:
+            digest = await session.scalar(
+                select(Product.media_hash).where(Product.id == product_id)
+            )
+        if digest is None:
+            # Задачи, поставленные до хранилища по содержимому
+            digest = await asyncio.get_running_loop().run_in_executor(None, _file_digest, source_path)
+        variants = await ensure_media_files(digest, source_path, wait=True)
+    except Exception as e:
+        await _fail_media_job(job_id, product_id, source_path, attempts, e)
+        return
+
+    try:
+        async with async_session() as session:
+            owned = await session.execute(
+                update(MediaJob)
+                .where(MediaJob.id == job_id, MediaJob.status == 'processing', MediaJob.attempts == attempts)
+                .values(status='done', error=None, lease_until=None)
+            )
+            if not owned.rowcount:
+                # Аренда истекла, и задача уже вернулась в очередь: исход
+                # решит следующая попытка, исходник ещё нужен ей
+                return
+
+            result = await session.execute(
+                update(Product)
+                .where(Product.id == product_id)
+                .values(
+                    media=variants['original'],
+                    media_variants=variants,
+                    media_hash=digest,
+                    media_status='ready',
+                    version=Product.version + 1
+                )
+            )
+            if result.rowcount:
+                await acquire_media(session, digest, variants, source_path, wait=True)
+                await increment_counter(session, CATALOG_VERSION_COUNTER)
+            await session.commit()
+    except Exception as e:
+        await _fail_media_job(job_id, product_id, source_path, attempts, e)
+        return
+
+    # Исходник нужен был acquire_media; если картинка уже была в хранилище,
+    # он так и не закодирован. Файлы удалённого товара уберёт media_gc
+    _remove_source(source_path)
+    if not result.rowcount:
+        # Товар удалили, пока картинка конвертировалась
+        return
+
+    _stats['processed'] += 1
+    await invalidate_restored_products(session)
+    # Клиент, дождавшийся статуса через /media, не должен получить старую карточку
+    await product_cache.invalidate_tag(product_tag(product_id), hard=True)
+    await product_cache.invalidate_tag(PRODUCT_LIST_TAG)
+
+
+async def _fail_media_job(job_id: int, product_id: int, source_path: str, attempts: int, error: Exception):
+    final = attempts >= MEDIA_JOB_MAX_ATTEMPTS
+
+    async with async_session() as session:
+        owned = await session.execute(
+            update(MediaJob)
+            .where(MediaJob.id == job_id, MediaJob.status == 'processing', MediaJob.attempts == attempts)
+            .values(status='failed' if final else 'pending', error=str(error)[:1000], lease_until=None)
+        )
+        if not owned.rowcount:
+            # Задачу уже забрали по истёкшей аренде
+            return
+        if final:
+            await session.execute(
+                update(Product)
+                .where(Product.id == product_id)
+                .values(media_status='failed', version=Product.version + 1)
+            )
+            await increment_counter(session, CATALOG_VERSION_COUNTER)
+        await session.commit()
+
+    if not final:
+        _stats['retried'] += 1
+        return
+
+    _stats['failed'] += 1
+    print(f"Не удалось обработать картинку товара {product_id}: {error}")
+    _remove_source(source_path)
+
+    # Клиент, дождавшийся статуса через /media, не должен получить старую карточку
+    await product_cache.invalidate_tag(product_tag(product_id), hard=True)
+    await product_cache.invalidate_tag(PRODUCT_LIST_TAG)
+
+
+async def requeue_expired_jobs():
+    """
+    Задачи с истёкшей арендой — воркер упал или завис посреди обработки —
+    снова в очередь. Задачи, исчерпавшие попытки, отмечаются failed: иначе
+    картинка, которая роняет процесс, крутилась бы в очереди вечно.
+    Задачи живых воркеров, в том числе других процессов, не трогаются.
+    """
+    async with async_session() as session:
+        expired = (await session.execute(
+            select(MediaJob.id, MediaJob.product_id, MediaJob.source_path, MediaJob.attempts)
+            .where(
+                MediaJob.status == 'processing',
+                or_(MediaJob.lease_until.is_(None), MediaJob.lease_until < _now())
+            )
+        )).all()
+
+        exhausted = []
+        for job in expired:
+            if job.attempts >= MEDIA_JOB_MAX_ATTEMPTS:
+                exhausted.append(job)
+                continue
+            result = await session.execute(
+                update(MediaJob)
+                .where(MediaJob.id == job.id, MediaJob.status == 'processing', MediaJob.attempts == job.attempts)
+                .values(status='pending', lease_until=None)
+            )
+            if result.rowcount:
+                _stats['expired'] += 1
+                _stats['retried'] += 1
+        await session.commit()
+
+    for job in exhausted:
+        _stats['expired'] += 1
+        await _fail_media_job(job.id, job.product_id, job.source_path, job.attempts, TimeoutError('аренда задачи истекла'))
+
+
+async def renew_media_job_leases(job_ids: list):
+    """Продлевает аренду задач, пока их обрабатывает этот воркер"""
+    while True:
+        await asyncio.sleep(MEDIA_JOB_LEASE_SECONDS / 3)
+        try:
+            async with async_session() as session:
+                await session.execute(
+                    update(MediaJob)
+                    .where(MediaJob.id.in_(job_ids), MediaJob.status == 'processing')
+                    .values(lease_until=_lease_deadline())
+                )
+                await session.commit()
+        except Exception as e:
+            print(f"Не удалось продлить аренду задач обработки картинок: {e}")
+
+
+async def run_media_worker(
+    concurrency: int = MEDIA_WORKER_CONCURRENCY,
+    poll_interval: float = MEDIA_WORKER_POLL_INTERVAL
+):
+    """Фоновый обработчик очереди media_jobs, запускается из lifespan"""
+    loop = asyncio.get_running_loop()
+    next_requeue = loop.time()
+
+    while True:
+        # Просроченные аренды проверяются не только при старте: воркер
+        # другого процесса может упасть, пока этот продолжает работать
+        if loop.time() >= next_requeue:
+            next_requeue = loop.time() + poll_interval
+            try:
+                await requeue_expired_jobs()
+            except Exception as e:
+                print(f"Не удалось вернуть в очередь задачи с истёкшей арендой: {e}")
+
+        # Сбрасываем до выборки: задача, поставленная во время выборки,
+        # снова поднимет флаг и не будет ждать следующего опроса
+        media_jobs_wakeup.clear()
+        try:
+            jobs = await claim_media_jobs(concurrency)
+        except Exception as e:
+            print(f"Не удалось получить задачи обработки картинок: {e}")
+            jobs = []
+
+        if jobs:
+            renewal = asyncio.create_task(renew_media_job_leases([job[0] for job in jobs]))
+            try:
+                results = await asyncio.gather(
+                    *(process_media_job(*job) for job in jobs),
+                    return_exceptions=True
+                )
+            finally:
+                renewal.cancel()
+
+            for job, result in zip(jobs, results):
+                if isinstance(result, Exception):
+                    print(f"Ошибка обработки задачи {job[0]}: {result}")
+                    try:
+                        await _fail_media_job(*job, result)
+                    except Exception as e:
+                        # Не вышло и это — задачу вернёт истёкшая аренда
+                        print(f"Не удалось отметить сбой задачи {job[0]}: {e}")
+            continue
+
+        try:
+            await asyncio.wait_for(media_jobs_wakeup.wait(), timeout=poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def get_media_job(session: AsyncSession, product_id: int) -> Optional[MediaJob]:
+    """Последняя задача по товару"""
+    return await session.scalar(
+        select(MediaJob)
+        .where(MediaJob.product_id == product_id)
+        .order_by(MediaJob.id.desc())
+        .limit(1)
+    )
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _lease_deadline() -> datetime:
+    return _now() + timedelta(seconds=MEDIA_JOB_LEASE_SECONDS)
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        while chunk := source.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _remove_source(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
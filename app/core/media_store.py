@@ -0,0 +1,196 @@
+import os
+import asyncio
+from typing import Callable, Optional, Union
+
+from sqlalchemy import delete, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.utils.photo_utils import (
+    content_webp_path,
+    convert_bytes_to_webp,
+    convert_file_to_webp,
+    media_path
+)
+from app.core.cache import product_cache, product_tag
+from app.core.coalesce import SingleFlight
+from app.core.counters import CATALOG_VERSION_COUNTER, increment_counter
+from app.core.image_engine import image_engine
+from app.core.metrics import register_metrics
+from db.models import MediaBlob, Product
+from db.session import async_session
+
+
+# Одновременные загрузки одной картинки кодируются один раз
+media_flight = SingleFlight()
+
+# Байты, путь к сырому файлу или функция, читающая байты (импорт из архива)
+MediaSource = Union[bytes, str, Callable[[], bytes]]
+
+# Ключ session.info: товары, которым acquire_media переписал ссылки
+RESTORED_PRODUCTS = 'media_restored_products'
+
+_stats = {
+    'stored': 0,
+    'deduplicated': 0,
+    'released': 0,
+    'restored': 0,
+}
+
+register_metrics('media_store', lambda: {**_stats, **media_flight.stats()})
+
+
+async def ensure_media_files(digest: str, source: MediaSource, wait: bool = False) -> dict:
+    """
+    Готовит файлы картинки с хэшем digest и возвращает ссылки на них.
+    Если такая картинка уже есть, кодирование пропускается. source — байты
+    загрузки, путь к сырому файлу или функция, возвращающая байты. Сырой
+    файл удаляет вызывающий код после коммита: он может понадобиться
+    acquire_media. Счётчик ссылок не трогает.
+    """
+    variants = await find_media(digest)
+    if variants is not None:
+        _stats['deduplicated'] += 1
+        return variants
+
+    return await _encode_media(digest, source, wait)
+
+
+async def find_media(digest: str) -> Optional[dict]:
+    """Ссылки на уже сохранённую картинку или None"""
+    async with async_session() as session:
+        blob = await session.get(MediaBlob, digest)
+
+    if blob is None or not await _files_exist(blob.variants):
+        return None
+    return blob.variants
+
+
+async def add_media_ref(session: AsyncSession, digest: str, variants: dict, count: int = 1) -> int:
+    """
+    +count ссылок на картинку в текущей транзакции; создаёт запись при
+    первой ссылке. Возвращает счётчик после изменения.
+    """
+    dialect = session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+
+    statement = insert(MediaBlob).values(hash=digest, variants=variants, refcount=count)
+    return await session.scalar(
+        statement.on_conflict_do_update(
+            index_elements=[MediaBlob.hash],
+            set_={
+                'refcount': MediaBlob.refcount + count,
+                'variants': statement.excluded.variants,
+            }
+        )
+        .returning(MediaBlob.refcount)
+    )
+
+
+async def acquire_media(
+    session: AsyncSession,
+    digest: str,
+    variants: dict,
+    source: MediaSource,
+    count: int = 1,
+    wait: bool = False
+) -> dict:
+    """
+    add_media_ref, после которого файлы гарантированно на месте. Вызывается
+    в транзакции товара, после того как товар добавлен или обновлён.
+
+    Файлы удаляет только сборщик (media_gc) и только без записи в
+    media_blobs. Если ссылки были и до нас, файлы под защитой. Если запись
+    создали мы, между find_media и этой транзакцией сборщик мог их убрать:
+    обновляем mtime (сборщик проверяет его после сверки с базой и не тронет
+    свежие файлы) и, если файлов уже нет, кодируем картинку заново.
+    Если при этом поменялись ссылки, после коммита нужно вызвать
+    invalidate_restored_products.
+    """
+    refcount = await add_media_ref(session, digest, variants, count)
+    if refcount > count:
+        return variants
+
+    paths = [media_path(url) for url in set(variants.values())]
+    if await asyncio.get_running_loop().run_in_executor(None, _touch_files, paths):
+        return variants
+
+    _stats['restored'] += 1
+    restored = await _encode_media(digest, source, wait)
+    if restored != variants:
+        # Набор ширин мог поменяться с прошлого кодирования
+        await session.execute(
+            update(MediaBlob).where(MediaBlob.hash == digest).values(variants=restored)
+        )
+        result = await session.execute(
+            update(Product)
+            .where(Product.media_hash == digest)
+            .values(media=restored['original'], media_variants=restored, version=Product.version + 1)
+            .returning(Product.id)
+        )
+        product_ids = result.scalars().all()
+        if product_ids:
+            await increment_counter(session, CATALOG_VERSION_COUNTER)
+            session.info.setdefault(RESTORED_PRODUCTS, set()).update(product_ids)
+    return restored
+
+
+async def invalidate_restored_products(session: AsyncSession):
+    """Вызывается после коммита: сбрасывает кэш товаров из acquire_media"""
+    for product_id in session.info.pop(RESTORED_PRODUCTS, ()):
+        await product_cache.invalidate_tag(product_tag(product_id), hard=True)
+
+
+async def release_media(session: AsyncSession, digest: Optional[str], count: int = 1):
+    """
+    -count ссылок на картинку. Без ссылок запись удаляется, а файлы остаются
+    сборщику media_gc: удалять их здесь нельзя, ту же картинку может
+    прямо сейчас загружать другой запрос.
+    """
+    if digest is None:
+        return
+
+    await session.execute(
+        update(MediaBlob)
+        .where(MediaBlob.hash == digest)
+        .values(refcount=MediaBlob.refcount - count)
+    )
+
+    result = await session.execute(
+        delete(MediaBlob)
+        .where(MediaBlob.hash == digest, MediaBlob.refcount <= 0)
+    )
+    if result.rowcount:
+        _stats['released'] += 1
+
+
+async def _encode_media(digest: str, source: MediaSource, wait: bool) -> dict:
+    webp_path = content_webp_path(digest)
+    if callable(source):
+        source = await asyncio.get_running_loop().run_in_executor(None, source)
+
+    if isinstance(source, str):
+        convert = lambda: image_engine.run(convert_file_to_webp, source, webp_path, wait=wait)
+    else:
+        convert = lambda: image_engine.run(convert_bytes_to_webp, source, webp_path, wait=wait)
+
+    variants = await media_flight.do(digest, convert)
+    _stats['stored'] += 1
+    return variants
+
+
+async def _files_exist(variants: dict) -> bool:
+    paths = [media_path(url) for url in set(variants.values())]
+    return await asyncio.get_running_loop().run_in_executor(
+        None, lambda: all(os.path.exists(path) for path in paths)
+    )
+
+
+def _touch_files(paths: list) -> bool:
+    """Обновляет mtime файлов; False, если какого-то уже нет"""
+    try:
+        for path in paths:
+            os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
@@ -0,0 +1,13 @@
+from typing import Callable
+
+
+# Имя подсистемы -> функция, возвращающая её текущие счётчики
+_sources: dict[str, Callable[[], dict]] = {}
+
+
+def register_metrics(name: str, source: Callable[[], dict]):
+    _sources[name] = source
+
+
+def collect_metrics() -> dict:
+    return {name: source() for name, source in _sources.items()}
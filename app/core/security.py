@@ -1,12 +1,132 @@
+import os
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 
+from app.core.metrics import register_metrics
+
+
+load_dotenv()
+# Стоимость bcrypt; хэши с другой стоимостью пересчитываются при входе
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', 32))
+
+LATENCY_WINDOW = 1024
+
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    # min = max = default: needs_update() срабатывает на любую другую стоимость
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+
+
+class PasswordHasherBusy(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={
+                'type': 'error',
+                'msg': 'Сервер перегружен, повторите попытку позже.'
+            },
+            headers={'Retry-After': '1'}
+        )
+
+
+class PasswordHasher:
+    """
+    bcrypt в отдельном пуле потоков: хэширование отпускает GIL, поэтому
+    event loop не стоит 100–300 мс на каждом входе. Задач в работе и в
+    очереди не больше max_pending — сверх этого сразу 503 (PasswordHasherBusy),
+    чтобы поток входов не копил бесконечную очередь.
+    """
+
+    def __init__(self, context: CryptContext, workers: int, max_pending: int):
+        self.context = context
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._times = deque(maxlen=LATENCY_WINDOW)
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> tuple:
+        """
+        (верен ли пароль, новый хэш или None). Новый хэш есть, если пароль
+        верен, а сохранённый хэш сделан с другими параметрами: его нужно
+        записать вместо старого.
+        """
+        valid, new_hash = await self._run(self.context.verify_and_update, password, hashed_password)
+        if new_hash is not None:
+            self.rehashed += 1
+        return valid, new_hash
+
+    async def _run(self, fn: Callable, *args):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        job = self._executor.submit(fn, *args)
+        self._pending += 1
+        # Слот освобождается, когда поток действительно закончит: отмена
+        # ожидающего запроса (клиент ушёл) не останавливает bcrypt
+        job.add_done_callback(lambda done: _call_in_loop(loop, self._release, done, started))
+        return await asyncio.wrap_future(job)
+
+    def _release(self, job: Future, started: float):
+        self._pending -= 1
+        if not job.cancelled():
+            self.completed += 1
+            self._times.append(time.perf_counter() - started)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        times = sorted(self._times)
+        return {
+            'rounds': BCRYPT_ROUNDS,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'pending': self._pending,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'rehashed': self.rehashed,
+            'p50_ms': round(times[len(times) // 2] * 1000, 1) if times else None,
+            'p99_ms': round(times[int(len(times) * 0.99)] * 1000, 1) if times else None,
+        }
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+def _call_in_loop(loop: asyncio.AbstractEventLoop, callback: Callable, *args):
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+    except RuntimeError:
+        # loop уже закрыт (остановка приложения) — считать некому
+        pass
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
 
+password_hasher = PasswordHasher(pwd_context, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+register_metrics('password_hasher', password_hasher.stats)
@@ -0,0 +1,90 @@
+import os
+from collections import OrderedDict
+
+import orjson
+from dotenv import load_dotenv
+from fastapi import Response, status
+
+from app.core.metrics import register_metrics
+from db.models.product import Product
+
+
+load_dotenv()
+PRODUCT_BLOB_CACHE_SIZE = int(os.getenv('PRODUCT_BLOB_CACHE_SIZE', 10000))
+
+
+def product_to_dict(product: Product) -> dict:
+    """Поля ProductOutSchema в виде, готовом для orjson"""
+    return {
+        'id': product.id,
+        'name': product.name,
+        'description': product.description,
+        'price': float(product.price) if product.price is not None else None,
+        'media': product.media,
+        'media_variants': product.media_variants or ({'original': product.media} if product.media else {}),
+        'media_status': product.media_status,
+        'rating_count': product.rating_count,
+        'rating_avg': product.rating_avg,
+        'rating_histogram': product.rating_histogram,
+        'created_at': product.created_at,
+        'updated_at': product.updated_at,
+    }
+
+
+class ProductBlobCache:
+    """
+    Готовый JSON каждого товара. Ключ — (id, version): version растёт при
+    любом изменении товара, так что устаревший фрагмент просто перестаёт
+    запрашиваться и вытесняется LRU.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._blobs: OrderedDict[tuple, bytes] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, product: Product) -> bytes:
+        key = (product.id, product.version)
+        blob = self._blobs.get(key)
+
+        if blob is not None:
+            self.hits += 1
+            self._blobs.move_to_end(key)
+            return blob
+
+        self.misses += 1
+        blob = orjson.dumps(product_to_dict(product))
+        self._blobs[key] = blob
+        if len(self._blobs) > self.max_entries:
+            self._blobs.popitem(last=False)
+        return blob
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._blobs),
+        }
+
+
+product_blobs = ProductBlobCache(max_entries=PRODUCT_BLOB_CACHE_SIZE)
+
+register_metrics('product_blobs', product_blobs.stats)
+
+
+def success_body(msg: str, data: bytes) -> bytes:
+    """Тело {"type":"success","msg":...,"data":...} вокруг уже сериализованных data"""
+    return b'{"type":"success","msg":' + orjson.dumps(msg) + b',"data":' + data + b'}'
+
+
+def product_list_body(msg: str, meta: dict, products: list[Product]) -> bytes:
+    """Листинг склеивается из готовых фрагментов товаров, без повторной сериализации"""
+    items = b'[' + b','.join(product_blobs.get(product) for product in products) + b']'
+    # meta сериализуется как объект, items дописываются последним полем
+    data = orjson.dumps(meta)[:-1] + (b',"items":' if meta else b'"items":') + items + b'}'
+    return success_body(msg, data)
+
+
+def json_bytes_response(body: bytes, status_code: int = status.HTTP_200_OK) -> Response:
+    return Response(content=body, status_code=status_code, media_type='application/json')
@@ -0,0 +1,185 @@
+import os
+import gzip
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Optional
+
+import anyio
+import orjson
+from dotenv import load_dotenv
+from fastapi import Request, Response, status
+
+from app.api.utils.http_cache_utils import is_not_modified, set_validators
+from app.core.metrics import register_metrics
+from app.core.static_files import accepted_encodings, brotli
+
+
+load_dotenv()
+# Как часто сверять mtime index.html: новая сборка подхватится не позже
+SPA_SHELL_CHECK_INTERVAL = float(os.getenv('SPA_SHELL_CHECK_INTERVAL', 1))
+# Встраивать данные первого экрана в index.html (1) или нет (0)
+SPA_INLINE_DATA = os.getenv('SPA_INLINE_DATA', '0') == '1'
+# Сколько готовых страниц с данными держать в памяти
+SPA_INLINE_CACHE_SIZE = int(os.getenv('SPA_INLINE_CACHE_SIZE', 256))
+INLINE_DATA_ID = '__INITIAL_DATA__'
+
+
+@dataclass
+class ShellEntry:
+    mtime_ns: int
+    etag: str
+    last_modified: Optional[datetime]
+    # Кодировка ('identity', 'br', 'gzip') -> тело
+    bodies: dict = field(default_factory=dict)
+
+
+def encode_shell(html: bytes, mtime_ns: int) -> ShellEntry:
+    bodies = {'identity': html, 'gzip': gzip.compress(html, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        bodies['br'] = brotli.compress(html, quality=11)
+
+    return ShellEntry(
+        mtime_ns=mtime_ns,
+        etag=hashlib.sha1(html).hexdigest()[:16],
+        last_modified=datetime.fromtimestamp(mtime_ns / 1e9, tz=timezone.utc),
+        bodies=bodies
+    )
+
+
+def inline_data_script(path: str, body: bytes) -> bytes:
+    """
+    <script type="application/json"> с готовым телом ответа API. '<' экранируется,
+    чтобы '</script>' из описания товара не закрыл тег раньше времени.
+    """
+    data = b'{"path":' + orjson.dumps(path) + b',"data":' + body + b'}'
+    return (
+        f'<script id="{INLINE_DATA_ID}" type="application/json">'.encode()
+        + data.replace(b'<', b'\\u003c')
+        + b'</script>'
+    )
+
+
+def compose_shell(html: bytes, script: bytes) -> bytes:
+    for marker in (b'</head>', b'</body>'):
+        position = html.find(marker)
+        if position != -1:
+            return html[:position] + script + html[position:]
+    return html + script
+
+
+class SpaShell:
+    """
+    index.html сборки React в памяти, вместе со сжатыми копиями. Файл
+    перечитывается, когда меняется его mtime; mtime сверяется не чаще раза
+    в check_interval секунд. Чтение и сжатие идут в потоке, поэтому
+    обработчик не блокирует event loop на диске.
+    """
+
+    def __init__(self, path: str, check_interval: float = SPA_SHELL_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._entry: Optional[ShellEntry] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        # Путь -> (ETag оболочки, ETag данных, готовая страница)
+        self._inlined = OrderedDict()
+        self.hits = 0
+        self.reloads = 0
+        self.inline_hits = 0
+        self.inline_builds = 0
+
+    async def get(self) -> ShellEntry:
+        entry = self._entry
+        if entry is not None and time.monotonic() - self._checked_at < self.check_interval:
+            self.hits += 1
+            return entry
+
+        # Одновременные запросы после истечения интервала ждут одну проверку
+        async with self._lock:
+            if self._entry is not None and time.monotonic() - self._checked_at < self.check_interval:
+                self.hits += 1
+                return self._entry
+
+            mtime_ns = (await anyio.to_thread.run_sync(os.stat, self.path)).st_mtime_ns
+            if self._entry is None or self._entry.mtime_ns != mtime_ns:
+                self._entry = await anyio.to_thread.run_sync(self._load, mtime_ns)
+                self.reloads += 1
+            else:
+                self.hits += 1
+            self._checked_at = time.monotonic()
+            return self._entry
+
+    def _load(self, mtime_ns: int) -> ShellEntry:
+        with open(self.path, 'rb') as file:
+            return encode_shell(file.read(), mtime_ns)
+
+    async def with_data(self, shell: ShellEntry, path: str, data_etag: Optional[str], body: bytes) -> ShellEntry:
+        """
+        Оболочка со встроенными данными. Готовая и сжатая страница хранится,
+        пока не изменится оболочка или ETag данных (версия каталога/товара).
+        """
+        cached = self._inlined.get(path)
+        if cached is not None and data_etag is not None and cached[:2] == (shell.etag, data_etag):
+            self._inlined.move_to_end(path)
+            self.inline_hits += 1
+            return cached[2]
+
+        html = compose_shell(shell.bodies['identity'], inline_data_script(path, body))
+        entry = await anyio.to_thread.run_sync(encode_shell, html, shell.mtime_ns)
+        # Дата файла ничего не говорит о свежести данных — только ETag
+        entry = replace(entry, last_modified=None)
+        self.inline_builds += 1
+
+        if data_etag is not None:
+            self._inlined[path] = (shell.etag, data_etag, entry)
+            self._inlined.move_to_end(path)
+            while len(self._inlined) > SPA_INLINE_CACHE_SIZE:
+                self._inlined.popitem(last=False)
+
+        return entry
+
+    async def response(self, request: Request, inline: Optional[tuple] = None) -> Response:
+        """inline — (путь, ETag данных, тело ответа API) для встраивания"""
+        entry = await self.get()
+        if inline is not None:
+            entry = await self.with_data(entry, *inline)
+        return shell_response(request, entry)
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'reloads': self.reloads,
+            'encodings': sorted(self._entry.bodies) if self._entry else [],
+            'inline_hits': self.inline_hits,
+            'inline_builds': self.inline_builds,
+            'inline_cached': len(self._inlined),
+        }
+
+
+def shell_response(request: Request, entry: ShellEntry) -> Response:
+    """Ответ с подходящей клиенту кодировкой; ETag у каждой кодировки свой"""
+    encodings = accepted_encodings(request.headers)
+    encoding = next((name for name in ('br', 'gzip') if name in encodings and name in entry.bodies), 'identity')
+    etag = f'"{entry.etag}"' if encoding == 'identity' else f'"{entry.etag}-{encoding}"'
+
+    if is_not_modified(request, etag, entry.last_modified):
+        response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(content=entry.bodies[encoding], media_type='text/html')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+
+    set_validators(response, etag, entry.last_modified)
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+spa_shell = SpaShell(
+    os.path.join(os.path.dirname(__file__), '..', '..', 'react-app', 'build', 'index.html')
+)
+
+register_metrics('spa_shell', spa_shell.stats)
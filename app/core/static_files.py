@@ -0,0 +1,315 @@
+import os
+import re
+import gzip
+import stat
+import hashlib
+from mimetypes import guess_type
+from os import PathLike
+from typing import Callable, Optional
+
+import anyio
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # необязательная зависимость: без неё только .gz
+    brotli = None
+
+from app.api.utils.photo_utils import MEDIA_WEBP_QUALITY, render_derivative
+from app.core.derivatives import DerivativeCache, derivative_cache
+from app.core.image_engine import image_engine
+
+
+load_dotenv()
+# Разрешённые размеры: произвольные w/h позволили бы забить кэш мусором
+DERIVATIVE_SIZES = {
+    int(size) for size in os.getenv('DERIVATIVE_SIZES', '100, 200, 320, 480, 640, 960, 1280').split(',') if size.strip()
+}
+DERIVATIVE_FITS = {'contain', 'cover'}
+DERIVATIVE_FORMATS = {'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+RESIZE_PARAMS = {'w', 'h', 'fit', 'fmt'}
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+# Копии по ?w=&h= зависят не только от источника, но и от настроек кодека
+# (MEDIA_WEBP_QUALITY), которые меняются без смены URL, — поэтому не immutable
+DERIVATIVE_MAX_AGE = int(os.getenv('DERIVATIVE_MAX_AGE', 86400))
+DERIVATIVE_CACHE = f'public, max-age={DERIVATIVE_MAX_AGE}'
+# Хэш в имени от сборки React: main.1a2b3c4d.js, 453.8f2e1c0a.chunk.js
+HASHED_ASSET = re.compile(r'\.[0-9a-f]{8,}\.')
+# Хранилище по содержимому: file_storage/<xx>/<sha256>[_w<ширина>[.<хэш копии>]].webp
+CONTENT_ADDRESSED = re.compile(r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{64}(?:_w\d+(?:\.[0-9a-f]{8})?)?\.webp$')
+# Accept-Encoding -> расширение рядом лежащей сжатой копии, в порядке предпочтения
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSIBLE_EXTENSIONS = {'.js', '.css', '.html', '.svg', '.json', '.map', '.txt', '.ico'}
+PRECOMPRESS_MIN_SIZE = 1024
+
+
+def is_hashed_asset(path: str) -> bool:
+    return HASHED_ASSET.search(os.path.basename(path)) is not None
+
+
+def is_content_addressed(path: str) -> bool:
+    return CONTENT_ADDRESSED.search(str(path).replace('\\', '/')) is not None
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles с заголовками кэширования: файлы, для которых immutable(путь)
+    истинно, кэшируются на год без перепроверки, остальные — с перепроверкой
+    по ETag. С precompressed=True отдаёт лежащие рядом .br/.gz, если клиент
+    их принимает. Range и If-None-Match/If-Modified-Since обрабатывает
+    FileResponse/StaticFiles из Starlette.
+    """
+
+    def __init__(self, *args, immutable: Callable[[str], bool], precompressed: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable = immutable
+        self.precompressed = precompressed
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if self.precompressed and scope['method'] in ('GET', 'HEAD'):
+            encodings = accepted_encodings(Headers(scope=scope))
+            if encodings:
+                found = await anyio.to_thread.run_sync(self.lookup_precompressed, path, encodings)
+                if found is not None:
+                    full_path, stat_result, original_path, encoding = found
+                    return self.file_response(
+                        full_path, stat_result, scope,
+                        media_type=guess_type(original_path)[0],
+                        cache_control=IMMUTABLE if self.immutable(original_path) else REVALIDATE,
+                        encoding=encoding
+                    )
+
+        return await super().get_response(path, scope)
+
+    def lookup_precompressed(self, path: str, encodings: set) -> Optional[tuple]:
+        original_path, original_stat = self.lookup_path(path)
+        if original_stat is None or not stat.S_ISREG(original_stat.st_mode):
+            return None
+
+        for encoding, extension in PRECOMPRESSED:
+            if encoding not in encodings:
+                continue
+            full_path, stat_result = self.lookup_path(path + extension)
+            # Копия старше оригинала — от прошлой сборки
+            if stat_result is not None and stat_result.st_mtime >= original_stat.st_mtime:
+                return full_path, stat_result, original_path, encoding
+
+        return None
+
+    def file_response(
+        self,
+        full_path: PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+        media_type: Optional[str] = None,
+        cache_control: Optional[str] = None,
+        encoding: Optional[str] = None,
+        etag: Optional[str] = None
+    ) -> Response:
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, media_type=media_type)
+        if etag is not None:
+            response.headers['etag'] = etag
+        response.headers['Cache-Control'] = cache_control or (
+            IMMUTABLE if self.immutable(str(full_path)) else REVALIDATE
+        )
+        if self.precompressed:
+            response.headers['Vary'] = 'Accept-Encoding'
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def accepted_encodings(headers: Headers) -> set:
+    """Кодировки из Accept-Encoding, кроме явно запрещённых через q=0"""
+    encodings = set()
+    for item in headers.get('accept-encoding', '').split(','):
+        name, _, params = item.strip().partition(';')
+        if name and params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            encodings.add(name.lower())
+    return encodings
+
+
+def precompress_directory(directory: str) -> int:
+    """
+    Готовит .gz (и .br, если установлен brotli) рядом с текстовыми файлами
+    сборки. Свежие копии не пересоздаются, так что вызывать можно на каждом
+    старте. Возвращает число записанных файлов.
+    """
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            source_stat = os.stat(path)
+            if source_stat.st_size < PRECOMPRESS_MIN_SIZE:
+                continue
+
+            with open(path, 'rb') as source:
+                data = None
+                for extension, compress in _compressors():
+                    target = path + extension
+                    if os.path.exists(target) and os.stat(target).st_mtime >= source_stat.st_mtime:
+                        continue
+                    if data is None:
+                        data = source.read()
+                    _write_atomic(target, compress(data))
+                    written += 1
+
+    return written
+
+
+async def precompress_static(directory: str):
+    """Сжатие сборки при старте, в потоке: запускается из lifespan"""
+    try:
+        written = await anyio.to_thread.run_sync(precompress_directory, directory)
+    except OSError as e:
+        print(f"Не удалось подготовить сжатые копии статики: {e}")
+    else:
+        if written:
+            print(f"Подготовлено сжатых копий статики: {written}")
+
+
+def _compressors() -> list:
+    compressors = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    return compressors
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as target:
+        target.write(data)
+    os.replace(tmp_path, path)
+
+
+class MediaStaticFiles(CachedStaticFiles):
+    """
+    StaticFiles для file_storage. С параметрами ?w=&h=&fit=&fmt= отдаёт
+    уменьшенную копию из DerivativeCache, без них — сам файл.
+    Отрисовка идёт в image_engine, готовые копии отдаются FileResponse,
+    то есть через pathsend/sendfile, если сервер это поддерживает.
+    Картинки из хранилища по содержимому кэшируются как неизменные, копии
+    от них — на DERIVATIVE_MAX_AGE с ETag от настроек отрисовки.
+    """
+
+    def __init__(self, *args, cache: DerivativeCache = derivative_cache, **kwargs):
+        kwargs.setdefault('immutable', is_content_addressed)
+        super().__init__(*args, **kwargs)
+        self.cache = cache
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        query = QueryParams(scope['query_string'])
+        if not RESIZE_PARAMS.intersection(query.keys()):
+            return await super().get_response(path, scope)
+
+        if scope['method'] not in ('GET', 'HEAD'):
+            raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+        width, height, fit, fmt = parse_resize_params(query)
+
+        source_path, source_stat = await anyio.to_thread.run_sync(self.lookup_path, path)
+        if source_stat is None or not stat.S_ISREG(source_stat.st_mode):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+        # mtime источника и качество в имени: перекодированный оригинал или
+        # новое MEDIA_WEBP_QUALITY дают новую копию
+        stem = os.path.splitext(os.path.basename(source_path))[0]
+        name = f"{stem}.{width}x{height}.{fit}.q{MEDIA_WEBP_QUALITY}.{source_stat.st_mtime_ns:x}.{fmt}"
+
+        def render(target_path: str):
+            return image_engine.run(render_derivative, source_path, target_path, width, height, fit, fmt)
+
+        for _ in range(2):
+            derivative_path = await self.cache.get(name, render)
+            try:
+                derivative_stat = await anyio.to_thread.run_sync(os.stat, derivative_path)
+            except FileNotFoundError:
+                # Вытеснен или удалён между get и stat — отрисуем заново
+                self.cache.forget(name)
+                continue
+
+            # ETag от имени копии, а не от её stat: в имени источник, размеры и
+            # качество, так что новое MEDIA_WEBP_QUALITY даёт новый валидатор,
+            # а перерисовка после вытеснения из кэша — прежний
+            return self.file_response(
+                derivative_path,
+                derivative_stat,
+                scope,
+                media_type=DERIVATIVE_FORMATS[fmt],
+                cache_control=DERIVATIVE_CACHE if self.immutable(source_path) else REVALIDATE,
+                etag=f'"{hashlib.md5(name.encode()).hexdigest()}"'
+            )
+
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+def parse_resize_params(query: QueryParams) -> tuple:
+    try:
+        width = int(query.get('w', 0))
+        height = int(query.get('h', 0))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                'type': 'error',
+                'msg': 'w и h должны быть целыми числами.'
+            }
+        )
+
+    if not width and not height:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                'type': 'error',
+                'msg': 'Нужно указать w или h.'
+            }
+        )
+
+    for size in (width, height):
+        if size and size not in DERIVATIVE_SIZES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={
+                    'type': 'error',
+                    'msg': f'Размер {size} не разрешён. Доступны: {", ".join(map(str, sorted(DERIVATIVE_SIZES)))}'
+                }
+            )
+
+    fit = query.get('fit', 'contain')
+    if fit not in DERIVATIVE_FITS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                'type': 'error',
+                'msg': f'fit должен быть одним из: {", ".join(sorted(DERIVATIVE_FITS))}'
+            }
+        )
+
+    fmt = query.get('fmt', 'webp')
+    if fmt not in DERIVATIVE_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                'type': 'error',
+                'msg': f'fmt должен быть одним из: {", ".join(DERIVATIVE_FORMATS)}'
+            }
+        )
+
+    if not (width and height):
+        # Без второй стороны обрезать нечего
+        fit = 'contain'
+
+    return width, height, fit, fmt
@@ -0,0 +1,105 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.metrics import register_metrics
+from db.models import User
+
+
+load_dotenv()
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 60))
+USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000))
+
+
+@dataclass(frozen=True, slots=True)
+class CurrentUser:
+    """Снимок пользователя без пароля; не привязан к сессии, можно кэшировать"""
+    id: int
+    username: str
+    email: str
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_user(cls, user: User) -> 'CurrentUser':
+        return cls(id=user.id, username=user.username, email=user.email, created_at=user.created_at)
+
+
+class UserCache:
+    """
+    LRU снимков пользователей по id с TTL. update_user сбрасывает запись;
+    TTL ограничивает устаревание, если пользователя поменяли в обход API.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[int, tuple] = OrderedDict()
+        self._invalidations = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[CurrentUser]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[1] < time.monotonic():
+            self._entries.pop(user_id, None)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, user: CurrentUser, invalidations: int):
+        # Пока читали из БД, запись сбросили — прочитанное могло устареть
+        if invalidations != self._invalidations:
+            return
+
+        self._entries[user.id] = (user, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        self._invalidations += 1
+        self._entries.pop(user_id, None)
+
+    @property
+    def invalidations(self) -> int:
+        return self._invalidations
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'size': len(self._entries),
+            'invalidations': self._invalidations,
+        }
+
+
+user_cache = UserCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL)
+
+register_metrics('user_cache', user_cache.stats)
+
+
+async def load_current_user(session: AsyncSession, user_id: int) -> Optional[CurrentUser]:
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    invalidations = user_cache.invalidations
+    row = await session.scalar(select(User).where(User.id == user_id))
+    if row is None:
+        return None
+
+    user = CurrentUser.from_user(row)
+    user_cache.put(user, invalidations)
+    return user
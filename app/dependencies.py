@@ -1,11 +1,12 @@
+from typing import Optional
+
 from fastapi import Depends, Request
 
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.session import async_session
-from db.models import User
 from app.core.jwt import verify_access_token
+from app.core.user_cache import CurrentUser, load_current_user
 
 
 async def get_session():
@@ -13,8 +14,11 @@ async def get_session():
         yield session
 
 
-async def get_current_user(request: Request, session: AsyncSession = Depends(get_session)):
-    """Получает текущего пользователя из JWT-токена (если он есть)"""
+async def get_current_user(request: Request, session: AsyncSession = Depends(get_session)) -> Optional[CurrentUser]:
+    """
+    Получает текущего пользователя из JWT-токена (если он есть). Возвращает
+    снимок из user_cache, а не ORM-объект: SELECT идёт только при промахе.
+    """
     token = request.cookies.get("access_token")
     if not token:
         return None
@@ -23,9 +27,4 @@ async def get_current_user(request: Request, session: AsyncSession = Depends(get
     if not payload:
         return None
 
-    user = await session.scalar(select(User).where(User.id == payload.get('id')))
-
-    if not user:
-        return None
-
-    return user
+    return await load_current_user(session, payload.get('id'))
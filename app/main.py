@@ -1,13 +1,24 @@
 import os
+import re
+import asyncio
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from .api.utils.env_sync import env_sync
 from .api.routes import router as api_router
+from .api.routes.products import cached_product, first_products_page
+from .api.utils.rating_utils import run_ratings_reconciliation
+from .core.counters import reconcile_counters, run_counters_reconciliation
+from .core.image_engine import image_engine
+from .core.media_gc import run_media_gc
+from .core.media_jobs import run_media_worker
+from .core.security import password_hasher
+from .core.spa_shell import SPA_INLINE_DATA, spa_shell
+from .core.static_files import CachedStaticFiles, MediaStaticFiles, is_hashed_asset, precompress_static
 
 
 load_dotenv()
@@ -16,7 +27,33 @@ HOST = os.getenv('HOST')
 
 env_sync()
 
-app = FastAPI()
+path_to_build = os.path.join(os.path.dirname(
+    __file__), '..', 'react-app', 'build')
+static_dir = os.path.join(path_to_build, 'static')
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await reconcile_counters()
+    background_tasks = [
+        asyncio.create_task(run_counters_reconciliation()),
+        asyncio.create_task(run_ratings_reconciliation()),
+        asyncio.create_task(image_engine.warm_up()),
+        asyncio.create_task(run_media_worker()),
+        asyncio.create_task(run_media_gc()),
+        asyncio.create_task(precompress_static(static_dir)),
+    ]
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    image_engine.shutdown()
+    password_hasher.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,19 +62,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-path_to_build = os.path.join(os.path.dirname(
-    __file__), '..', 'react-app', 'build')
-
 app.mount(
     "/static",
-    StaticFiles(
-        directory=os.path.join(path_to_build, 'static')
+    CachedStaticFiles(
+        directory=static_dir,
+        immutable=is_hashed_asset,
+        precompressed=True
     ),
     name="static"
 )
 app.mount(
     "/files",
-    StaticFiles(
+    MediaStaticFiles(
         directory=os.path.join(os.path.dirname(__file__), "..", "file_storage")
     ),
     name="files"
@@ -46,8 +82,29 @@ app.mount(
 app.include_router(api_router)
 
 
+PRODUCT_PAGE = re.compile(r'product/(\d+)')
+
+
+async def initial_data(full_path: str):
+    """Данные первого экрана из кэша API: (путь, ETag, тело ответа) или None"""
+    try:
+        if full_path == '':
+            cached = await first_products_page()
+        elif match := PRODUCT_PAGE.fullmatch(full_path):
+            cached = await cached_product(int(match.group(1)))
+        else:
+            return None
+    except HTTPException:
+        return None
+    except Exception as e:
+        # Без данных страница всё равно откроется и загрузит их сама
+        print(f"Не удалось подготовить данные для {full_path!r}: {e}")
+        return None
+
+    return '/' + full_path, cached['etag'], cached['body']
+
+
 @app.get("/{full_path:path}", response_class=HTMLResponse)
-def server_spa():
-    with open(os.path.join(path_to_build, 'index.html'), 'r', encoding='utf-8') as file:
-        html_content = file.read()
-    return HTMLResponse(content=html_content, status_code=200)
+async def server_spa(request: Request, full_path: str):
+    inline = await initial_data(full_path) if SPA_INLINE_DATA else None
+    return await spa_shell.response(request, inline)
@@ -0,0 +1,67 @@
+"""
+Стоимость зависимости get_current_user на один запрос: с кэшем проверенных
+JWT (TokenCache) и с полной проверкой подписи каждый раз. Пользователь
+заранее лежит в user_cache, поэтому БД не участвует — меряется только
+разбор cookie, проверка токена и поиск снимка.
+
+    python -m benchmarks.auth_dependency_bench
+    python -m benchmarks.auth_dependency_bench --requests 50000 --users 500
+"""
+import time
+import asyncio
+import argparse
+from datetime import datetime
+
+from fastapi import Request
+
+from app.core.jwt import create_access_token, token_cache
+from app.core.user_cache import CurrentUser, user_cache
+from app.dependencies import get_current_user
+
+
+def make_request(token: str) -> Request:
+    return Request({
+        'type': 'http',
+        'method': 'GET',
+        'path': '/api/user/me',
+        'headers': [(b'cookie', f'access_token={token}'.encode())],
+    })
+
+
+async def run_case(name: str, requests: list, max_entries: int):
+    token_cache.max_entries = max_entries
+    token_cache.clear()
+
+    started = time.perf_counter()
+    for request in requests:
+        assert await get_current_user(request, session=None) is not None
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{name:<10} {len(requests) / elapsed:10.0f} запросов/с   "
+        f"{elapsed / len(requests) * 1e6:6.1f} мкс на запрос"
+    )
+
+
+async def main(args):
+    now = datetime(2025, 3, 30, 1, 4, 55)
+    tokens = []
+    for user_id in range(1, args.users + 1):
+        user_cache.put(CurrentUser(id=user_id, username=f'user{user_id}', email=f'user{user_id}@example.com', created_at=now), user_cache.invalidations)
+        tokens.append(create_access_token({'id': user_id, 'username': f'user{user_id}'}))
+
+    # Каждый пользователь делает несколько запросов подряд с одним токеном
+    requests = [make_request(tokens[index % len(tokens)]) for index in range(args.requests)]
+
+    print(f"запросов: {args.requests}, пользователей: {args.users}")
+    await run_case('без кэша', requests, 0)
+    await run_case('с кэшем', requests, args.users)
+    print(token_cache.stats())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=200)
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,82 @@
+"""
+Проверяет, что каждая комбинация sort/min_price/max_price/after в
+GET /api/products/ обслуживается индексом, без сортировки во временном дереве.
+
+    python -m benchmarks.explain_product_queries
+
+Берёт базу из DATABASE_URL, завершается с кодом 1, если хоть один план
+содержит сортировку.
+"""
+import sys
+import asyncio
+import itertools
+
+from sqlalchemy import text
+
+from app.api.utils.catalog_utils import PRODUCT_SORTS, build_products_query
+from db.session import engine
+
+
+PRICE_FILTERS = [(None, None), (10, None), (None, 1000), (10, 1000)]
+
+
+def sample_cursor(sort: str) -> dict:
+    sort_column, _ = PRODUCT_SORTS[sort]
+    cursor = {'s': sort, 'id': 100}
+    if sort_column is not None:
+        cursor['v'] = 50.0
+    return cursor
+
+
+def plan_has_sort(dialect: str, plan: list[str]) -> bool:
+    if dialect == 'sqlite':
+        return any('TEMP B-TREE' in line for line in plan)
+    return any('Sort' in line for line in plan)
+
+
+async def explain(connection, dialect: str, statement) -> list[str]:
+    sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+
+    if dialect == 'sqlite':
+        rows = await connection.execute(text(f'EXPLAIN QUERY PLAN {sql}'))
+        return [row[-1] for row in rows]
+
+    rows = await connection.execute(text(f'EXPLAIN {sql}'))
+    return [row[0] for row in rows]
+
+
+async def main() -> int:
+    dialect = engine.dialect.name
+    failed = 0
+
+    async with engine.connect() as connection:
+        if dialect == 'postgresql':
+            # На маленьких таблицах Postgres предпочтёт seq scan,
+            # нас интересует, есть ли вообще подходящий индекс
+            await connection.execute(text('SET enable_seqscan = off'))
+
+        combinations = itertools.product(PRODUCT_SORTS, PRICE_FILTERS, [False, True])
+        for sort, (min_price, max_price), with_cursor in combinations:
+            statement = build_products_query(
+                sort=sort,
+                min_price=min_price,
+                max_price=max_price,
+                cursor=sample_cursor(sort) if with_cursor else None
+            ).limit(13)
+
+            plan = await explain(connection, dialect, statement)
+            ok = not plan_has_sort(dialect, plan)
+            failed += not ok
+
+            label = f"sort={sort} min_price={min_price} max_price={max_price} after={with_cursor}"
+            print(f"[{'OK' if ok else 'SORT'}] {label}")
+            for line in plan:
+                print(f"    {line}")
+
+    await engine.dispose()
+    print(f"Комбинаций с сортировкой: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
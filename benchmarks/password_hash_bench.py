@@ -0,0 +1,82 @@
+"""
+Задержка event loop при одновременных входах: проверка bcrypt прямо в
+обработчике, как было раньше, и через PasswordHasher в пуле потоков.
+Фоновая задача каждые TICK секунд засыпает и меряет, насколько позже
+положенного проснулась, — столько же ждал бы любой другой запрос.
+
+    python -m benchmarks.password_hash_bench
+    python -m benchmarks.password_hash_bench --logins 64 --rounds 12 --workers 4
+"""
+import time
+import asyncio
+import argparse
+
+from passlib.context import CryptContext
+
+from app.core.security import PasswordHasher
+
+
+TICK = 0.005
+
+
+async def measure_lag(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        samples.append(time.perf_counter() - started - TICK)
+
+
+async def blocking_login(context: CryptContext, password: str, hashed: str):
+    # Как было: синхронный bcrypt в корутине обработчика
+    await asyncio.sleep(0)
+    return context.verify(password, hashed)
+
+
+async def pooled_login(hasher: PasswordHasher, password: str, hashed: str):
+    return (await hasher.verify(password, hashed))[0]
+
+
+async def run_case(name: str, make_login, logins: int):
+    stop = asyncio.Event()
+    samples = []
+    ticker = asyncio.create_task(measure_lag(stop, samples))
+    await asyncio.sleep(TICK * 2)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(make_login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+    assert all(results)
+
+    samples.sort()
+    print(
+        f"{name:<10} {logins / elapsed:7.1f} входов/с   "
+        f"задержка loop: p50 {samples[len(samples) // 2] * 1000:7.1f} мс, "
+        f"p99 {samples[int(len(samples) * 0.99)] * 1000:7.1f} мс, "
+        f"max {samples[-1] * 1000:7.1f} мс"
+    )
+
+
+async def main(args):
+    context = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=args.rounds)
+    password = 'secret123'
+    hashed = context.hash(password)
+    hasher = PasswordHasher(context, workers=args.workers, max_pending=args.logins)
+
+    print(f"bcrypt rounds={args.rounds}, одновременных входов: {args.logins}, потоков: {args.workers}")
+    try:
+        await run_case('в loop', lambda: blocking_login(context, password, hashed), args.logins)
+        await run_case('пул', lambda: pooled_login(hasher, password, hashed), args.logins)
+    finally:
+        hasher.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=32)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=2)
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,105 @@
+"""
+Сравнение сериализации страницы каталога: прежний путь (валидация ORM-объектов
+через ProductListResponse + JSONResponse) и склейка готовых фрагментов orjson.
+
+    python -m benchmarks.serialization_bench
+"""
+import timeit
+from datetime import datetime
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.api.schemas.products_schema import ProductListResponse
+from app.core.serialization import ProductBlobCache, product_list_body
+import app.core.serialization as serialization
+from db.models.product import Product
+
+
+REPEAT = 5
+NUMBER = 200
+
+
+def make_products(count: int) -> list[Product]:
+    now = datetime(2025, 3, 30, 1, 4, 55)
+    return [
+        Product(
+            id=product_id,
+            name=f'Товар номер {product_id}',
+            description='Описание товара, достаточно длинное для каталога. ' * 6,
+            price=Decimal('1499.90'),
+            media=f'files/{product_id:032x}.webp',
+            version=1,
+            rating_count=42,
+            rating_sum=170,
+            rating_avg=170 / 42,
+            rating_hist_1=1,
+            rating_hist_2=2,
+            rating_hist_3=4,
+            rating_hist_4=15,
+            rating_hist_5=20,
+            created_at=now,
+            updated_at=now,
+        )
+        for product_id in range(1, count + 1)
+    ]
+
+
+def meta(count: int) -> dict:
+    return {
+        'total': 100000,
+        'total_estimated': False,
+        'page': 1,
+        'page_size': count,
+        'next_cursor': 'eyJpZCI6MTJ9',
+    }
+
+
+def pydantic_path(products: list[Product]) -> bytes:
+    payload = {
+        'type': 'success',
+        'msg': 'Продукты успешно получены',
+        'data': {**meta(len(products)), 'items': products},
+    }
+    validated = ProductListResponse.model_validate(payload, from_attributes=True)
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def blob_path(products: list[Product]) -> bytes:
+    return product_list_body('Продукты успешно получены', meta(len(products)), products)
+
+
+def measure(fn, products) -> float:
+    """Лучшее время одного вызова в микросекундах"""
+    timings = timeit.repeat(lambda: fn(products), repeat=REPEAT, number=NUMBER)
+    return min(timings) / NUMBER * 1e6
+
+
+def main():
+    print(f"{'items':>6} {'pydantic+json':>15} {'orjson cold':>13} {'orjson warm':>13} {'speedup':>8}")
+
+    for count in (12, 100):
+        products = make_products(count)
+
+        baseline = measure(pydantic_path, products)
+
+        # cold: кэш фрагментов пуст на каждом вызове
+        def cold(items):
+            serialization.product_blobs = ProductBlobCache(max_entries=1000)
+            return blob_path(items)
+
+        cold_time = measure(cold, products)
+
+        serialization.product_blobs = ProductBlobCache(max_entries=1000)
+        blob_path(products)
+        warm_time = measure(blob_path, products)
+
+        print(
+            f"{count:>6} {baseline:>13.1f}us {cold_time:>11.1f}us "
+            f"{warm_time:>11.1f}us {baseline / warm_time:>7.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
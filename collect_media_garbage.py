@@ -0,0 +1,42 @@
+"""
+Удаление картинок в file_storage, на которые больше ничего не ссылается.
+
+    python collect_media_garbage.py --dry-run
+    python collect_media_garbage.py --grace-hours 48 --quarantine /var/tmp/media_quarantine
+"""
+import asyncio
+import argparse
+
+import orjson
+
+from app.core.media_gc import (
+    MEDIA_GC_BATCH_SIZE,
+    MEDIA_GC_GRACE_HOURS,
+    MEDIA_GC_QUARANTINE_DIR,
+    UPLOAD_DIR,
+    collect_orphaned_media
+)
+
+
+async def main(args):
+    summary = await collect_orphaned_media(
+        directory=args.directory,
+        grace_hours=args.grace_hours,
+        quarantine_dir=args.quarantine,
+        batch_size=args.batch_size,
+        dry_run=args.dry_run
+    )
+    print(orjson.dumps(summary, option=orjson.OPT_INDENT_2).decode())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Сборка осиротевших картинок')
+    parser.add_argument('--directory', default=UPLOAD_DIR)
+    parser.add_argument('--grace-hours', type=float, default=MEDIA_GC_GRACE_HOURS,
+                        help='файлы моложе этого не трогаются')
+    parser.add_argument('--quarantine', default=MEDIA_GC_QUARANTINE_DIR,
+                        help='переносить сирот в этот каталог вместо удаления')
+    parser.add_argument('--batch-size', type=int, default=MEDIA_GC_BATCH_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help='только посчитать')
+
+    asyncio.run(main(parser.parse_args()))
@@ -1,4 +1,7 @@
 from .cart_item import CartItem
+from .counter import Counter
+from .media_blob import MediaBlob
+from .media_job import MediaJob
 from .product import Product
 from .rating import Rating
 from .user import User
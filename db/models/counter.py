@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, BigInteger, DateTime, func
+
+from db.base import Base
+
+
+class Counter(Base):
+    __tablename__ = "counters"
+
+    name = Column(String(64), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now()
+    )
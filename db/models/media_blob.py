@@ -0,0 +1,22 @@
+from sqlalchemy import JSON, Column, Integer, String, DateTime, func
+
+from db.base import Base
+
+
+class MediaBlob(Base):
+    """Картинка в хранилище по содержимому, см. app/core/media_store.py"""
+    __tablename__ = "media_blobs"
+
+    # sha256 исходных байт загрузки
+    hash = Column(String(64), primary_key=True)
+    # Ссылки на WebP и копии, как в Product.media_variants
+    variants = Column(JSON, nullable=False)
+    # Сколько товаров ссылается на картинку; на нуле запись удаляется,
+    # а файлы потом убирает media_gc
+    refcount = Column(Integer, nullable=False, default=0, server_default='0')
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now()
+    )
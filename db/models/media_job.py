@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index, func
+
+from db.base import Base
+
+
+class MediaJob(Base):
+    """Отложенная конвертация картинки товара, см. app/core/media_jobs.py"""
+    __tablename__ = "media_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    # Сырой загруженный файл в UPLOAD_DIR
+    source_path = Column(Text, nullable=False)
+    # pending -> processing -> done | failed
+    status = Column(String(16), nullable=False, default='pending', server_default='pending')
+    attempts = Column(Integer, nullable=False, default=0, server_default='0')
+    error = Column(Text, nullable=True)
+    # До какого момента задача закреплена за воркером; воркер продлевает
+    # аренду, пока работает, просроченную возвращают в очередь
+    lease_until = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now()
+    )
+
+    __table_args__ = (
+        Index("ix_media_jobs_status_id", "status", "id"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Numeric, DateTime, func
+from sqlalchemy import JSON, Column, Integer, String, Text, Numeric, Float, DateTime, Index, func
 from sqlalchemy.orm import relationship
 from db.base import Base
 
@@ -11,6 +11,24 @@ class Product(Base):
     description = Column(Text, nullable=True)
     price = Column(Numeric(10, 2), nullable=False, default=0)
     media = Column(Text, nullable=False)
+    # Копии картинки по ширинам: {"200": "files/..._w200.webp", ..., "original": media}
+    media_variants = Column(JSON, nullable=False, default=dict, server_default='{}')
+    # Ключ в media_blobs; NULL у товаров, созданных до хранилища по содержимому
+    media_hash = Column(String(64), nullable=True, index=True)
+    # ready | pending (картинка ещё конвертируется) | failed
+    media_status = Column(String(16), nullable=False, default='ready', server_default='ready')
+    # Растёт при каждом изменении товара, из неё строится ETag
+    version = Column(Integer, nullable=False, default=1, server_default='1')
+
+    # Агрегаты оценок, обновляются в rate_product
+    rating_count = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_sum = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_avg = Column(Float, nullable=False, default=0, server_default='0')
+    rating_hist_1 = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_hist_2 = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_hist_3 = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_hist_4 = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_hist_5 = Column(Integer, nullable=False, default=0, server_default='0')
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(
@@ -19,8 +37,24 @@ class Product(Base):
         onupdate=func.now()
     )
 
+    # Индексы под сортировки каталога, см. app/api/utils/catalog_utils.py
+    __table_args__ = (
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_rating_avg_id", "rating_avg", "id"),
+    )
+
     cart_items = relationship(
         "CartItem",
         back_populates="product",
         cascade="all, delete-orphan"
     )
+
+    @property
+    def rating_histogram(self):
+        return [
+            self.rating_hist_1 or 0,
+            self.rating_hist_2 or 0,
+            self.rating_hist_3 or 0,
+            self.rating_hist_4 or 0,
+            self.rating_hist_5 or 0,
+        ]
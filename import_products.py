@@ -0,0 +1,44 @@
+"""
+Массовый импорт товаров из манифеста и zip-архива с картинками.
+
+    python import_products.py products.csv --images images.zip
+    python import_products.py products.ndjson --images images.zip --batch-size 1000
+"""
+import sys
+import asyncio
+import argparse
+
+import orjson
+
+from app.api.utils.import_utils import IMPORT_BATCH_SIZE, IMPORT_WORKERS, detect_format, import_products
+from app.core.image_engine import image_engine
+
+
+async def main(args):
+    fmt = args.format or detect_format(args.manifest)
+
+    try:
+        with open(args.manifest, 'rb') as manifest:
+            async for event in import_products(manifest, fmt, args.images, args.batch_size, args.workers):
+                if 'error' in event:
+                    print(f"строка {event['row']}: {event['error']}", file=sys.stderr)
+                elif 'batch' in event:
+                    print(
+                        f"пачка {event['batch']}: обработано {event['rows']}, "
+                        f"импортировано {event['imported']}, ошибок {event['failed']}"
+                    )
+                else:
+                    print(orjson.dumps(event['summary'], option=orjson.OPT_INDENT_2).decode())
+    finally:
+        image_engine.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Импорт товаров из CSV/NDJSON')
+    parser.add_argument('manifest', help='CSV или NDJSON с полями name, description, price, image')
+    parser.add_argument('--images', required=True, help='zip-архив с картинками')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help='по умолчанию — по расширению манифеста')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=IMPORT_WORKERS)
+
+    asyncio.run(main(parser.parse_args()))
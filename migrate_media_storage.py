@@ -0,0 +1,142 @@
+"""
+Перенос картинок, сохранённых до хранилища по содержимому, в file_storage/<xx>/<хэш>.webp.
+Повторяющиеся файлы схлопываются в один, на товар заводится ссылка в media_blobs.
+Скрипт можно запускать повторно: товары с media_hash пропускаются.
+
+    python migrate_media_storage.py
+    python migrate_media_storage.py --dry-run
+"""
+import os
+import shutil
+import asyncio
+import hashlib
+import argparse
+
+from sqlalchemy import select, update
+
+from app.api.utils.photo_utils import content_webp_path, media_path, media_url, variant_path
+from app.core.counters import CATALOG_VERSION_COUNTER, increment_counter
+from app.core.media_store import add_media_ref
+from db.models import Product
+from db.session import async_session
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        while chunk := source.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def plan_moves(media: str, variants: dict, digest: str) -> tuple:
+    """Старые ссылки -> новые пути; возвращает (перемещения, новые media_variants)"""
+    original = media_path(media)
+    target = content_webp_path(digest)
+
+    moves = {original: target}
+    new_variants = {}
+    for name, url in (variants or {'original': media}).items():
+        path = media_path(url)
+        if path == original:
+            new_variants[name] = media_url(target)
+        else:
+            moves[path] = variant_path(target, int(name))
+            new_variants[name] = media_url(moves[path])
+
+    return moves, new_variants
+
+
+def copy_files(moves: dict) -> list:
+    """
+    Кладёт файлы по новым путям, не трогая старые (жёсткой ссылкой, где
+    можно). Возвращает созданные пути, чтобы их можно было убрать, если
+    коммит не пройдёт.
+    """
+    created = []
+    try:
+        for source, target in moves.items():
+            if os.path.exists(target):
+                # Такая картинка уже перенесена с другим товаром
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copy2(source, target)
+            created.append(target)
+    except BaseException:
+        remove_files(created)
+        raise
+    return created
+
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+async def main(args):
+    loop = asyncio.get_running_loop()
+    migrated = missing = 0
+
+    async with async_session() as session:
+        rows = (await session.execute(
+            select(Product.id, Product.media, Product.media_variants)
+            .where(Product.media_hash.is_(None), Product.media_status == 'ready', Product.media != '')
+            .order_by(Product.id)
+        )).all()
+
+    for product_id, media, variants in rows:
+        original = media_path(media)
+        if not os.path.exists(original):
+            missing += 1
+            print(f"товар {product_id}: нет файла {original}")
+            continue
+
+        # У старых картинок исходника нет, хэшируется сам WebP
+        digest = await loop.run_in_executor(None, file_digest, original)
+        moves, new_variants = plan_moves(media, variants, digest)
+
+        if args.dry_run:
+            print(f"товар {product_id}: {original} -> {moves[original]}")
+            migrated += 1
+            continue
+
+        # Старые файлы удаляются только после коммита: если он не пройдёт,
+        # товар по-прежнему ссылается на них, а новые копии убираются
+        created = await loop.run_in_executor(None, copy_files, moves)
+
+        try:
+            async with async_session() as session:
+                await session.execute(
+                    update(Product)
+                    .where(Product.id == product_id)
+                    .values(
+                        media=new_variants['original'],
+                        media_variants=new_variants,
+                        media_hash=digest,
+                        version=Product.version + 1
+                    )
+                )
+                await add_media_ref(session, digest, new_variants)
+                await increment_counter(session, CATALOG_VERSION_COUNTER)
+                await session.commit()
+        except Exception:
+            await loop.run_in_executor(None, remove_files, created)
+            raise
+
+        await loop.run_in_executor(None, remove_files, moves.keys())
+        migrated += 1
+
+    print(f"перенесено {migrated}, без файла {missing}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Перенос картинок в хранилище по содержимому')
+    parser.add_argument('--dry-run', action='store_true', help='только показать, что будет перенесено')
+
+    asyncio.run(main(parser.parse_args()))
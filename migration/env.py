@@ -6,7 +6,7 @@ from sqlalchemy import pool
 from alembic import context
 
 from db.base import Base
-from db.models import CartItem, Product, Rating, User
+from db.models import CartItem, Counter, MediaBlob, MediaJob, Product, Rating, User
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,37 @@
+"""Add counters
+
+Revision ID: 011b9632f67c
+Revises: 1a6fe2dd63fb
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '011b9632f67c'
+down_revision: Union[str, None] = '1a6fe2dd63fb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('counters',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.execute(
+        "INSERT INTO counters (name, value) "
+        "SELECT 'products', COUNT(*) FROM products"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('counters')
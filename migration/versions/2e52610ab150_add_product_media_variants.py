@@ -0,0 +1,39 @@
+"""Add product media variants
+
+Revision ID: 2e52610ab150
+Revises: 6ec7e3403886
+Create Date: 2026-10-18 15:12:41.207519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2e52610ab150'
+down_revision: Union[str, None] = '6ec7e3403886'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.add_column(sa.Column('media_variants', sa.JSON(), server_default='{}', nullable=False))
+
+    # У старых товаров есть только оригинал; одним UPDATE, без обхода строк
+    if op.get_bind().dialect.name == 'postgresql':
+        build_object = "json_build_object('original', media)"
+    else:
+        build_object = "json_object('original', media)"
+    op.execute(
+        f"UPDATE products SET media_variants = {build_object}, version = version + 1"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('media_variants')
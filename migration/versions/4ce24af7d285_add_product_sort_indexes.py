@@ -0,0 +1,30 @@
+"""Add product sort indexes
+
+Revision ID: 4ce24af7d285
+Revises: 301e0baa160a
+Create Date: 2026-10-18 12:37:55.841092
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4ce24af7d285'
+down_revision: Union[str, None] = '301e0baa160a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_products_price_id', 'products', ['price', 'id'], unique=False)
+    op.create_index('ix_products_rating_avg_id', 'products', ['rating_avg', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_rating_avg_id', table_name='products')
+    op.drop_index('ix_products_price_id', table_name='products')
@@ -0,0 +1,43 @@
+"""Add media blobs and product media hash
+
+Revision ID: 509f631e9f74
+Revises: a288e51cb1e0
+Create Date: 2026-10-18 16:48:06.731925
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '509f631e9f74'
+down_revision: Union[str, None] = 'a288e51cb1e0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('media_blobs',
+    sa.Column('hash', sa.String(length=64), nullable=False),
+    sa.Column('variants', sa.JSON(), nullable=False),
+    sa.Column('refcount', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('hash')
+    )
+
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.add_column(sa.Column('media_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_products_media_hash'), ['media_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_products_media_hash'))
+        batch_op.drop_column('media_hash')
+
+    op.drop_table('media_blobs')
@@ -0,0 +1,34 @@
+"""Add product version and catalog version counter
+
+Revision ID: 6ec7e3403886
+Revises: 4ce24af7d285
+Create Date: 2026-10-18 14:05:19.660384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6ec7e3403886'
+down_revision: Union[str, None] = '4ce24af7d285'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+    op.execute("INSERT INTO counters (name, value) VALUES ('catalog_version', 1)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM counters WHERE name = 'catalog_version'")
+
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('version')
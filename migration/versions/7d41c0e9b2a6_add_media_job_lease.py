@@ -0,0 +1,30 @@
+"""Add media job lease
+
+Revision ID: 7d41c0e9b2a6
+Revises: 509f631e9f74
+Create Date: 2026-10-18 21:12:40.184233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d41c0e9b2a6'
+down_revision: Union[str, None] = '509f631e9f74'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('media_jobs') as batch_op:
+        batch_op.add_column(sa.Column('lease_until', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('media_jobs') as batch_op:
+        batch_op.drop_column('lease_until')
@@ -0,0 +1,58 @@
+"""Add product rating aggregates
+
+Revision ID: 8c20bc6b97dd
+Revises: 011b9632f67c
+Create Date: 2026-10-18 11:02:47.518330
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c20bc6b97dd'
+down_revision: Union[str, None] = '011b9632f67c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+HISTOGRAM_COLUMNS = [f'rating_hist_{value}' for value in range(1, 6)]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.add_column(sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_avg', sa.Float(), server_default='0', nullable=False))
+        for column in HISTOGRAM_COLUMNS:
+            batch_op.add_column(sa.Column(column, sa.Integer(), server_default='0', nullable=False))
+
+    # Заполняем агрегаты по уже существующим оценкам
+    histogram = ', '.join(
+        f"rating_hist_{value} = (SELECT COUNT(*) FROM ratings "
+        f"WHERE ratings.product_id = products.id AND ratings.rating = {value})"
+        for value in range(1, 6)
+    )
+    op.execute(
+        "UPDATE products SET "
+        "rating_count = (SELECT COUNT(*) FROM ratings WHERE ratings.product_id = products.id), "
+        "rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM ratings WHERE ratings.product_id = products.id), "
+        f"{histogram}"
+    )
+    op.execute(
+        "UPDATE products SET rating_avg = CASE WHEN rating_count > 0 "
+        "THEN rating_sum * 1.0 / rating_count ELSE 0 END"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('products') as batch_op:
+        for column in reversed(HISTOGRAM_COLUMNS):
+            batch_op.drop_column(column)
+        batch_op.drop_column('rating_avg')
+        batch_op.drop_column('rating_sum')
+        batch_op.drop_column('rating_count')
@@ -0,0 +1,51 @@
+"""Add media jobs and product media status
+
+Revision ID: a288e51cb1e0
+Revises: 2e52610ab150
+Create Date: 2026-10-18 16:02:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a288e51cb1e0'
+down_revision: Union[str, None] = '2e52610ab150'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.add_column(sa.Column('media_status', sa.String(length=16), server_default='ready', nullable=False))
+
+    op.create_table('media_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('source_path', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=16), server_default='pending', nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_media_jobs_id'), 'media_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_media_jobs_product_id'), 'media_jobs', ['product_id'], unique=False)
+    op.create_index('ix_media_jobs_status_id', 'media_jobs', ['status', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_media_jobs_status_id', table_name='media_jobs')
+    op.drop_index(op.f('ix_media_jobs_product_id'), table_name='media_jobs')
+    op.drop_index(op.f('ix_media_jobs_id'), table_name='media_jobs')
+    op.drop_table('media_jobs')
+
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('media_status')
@@ -2,7 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { API_BASE_URL } from '../config';
 import { Link } from 'react-router-dom';
 import StarRating from '../components/StarRating';
-import { loadUserRatings, getRating } from '../utils/apiFunctions'; // Оставляем только импорт из apiFunctions.js
+import { loadUserRatings, getRating, buildSrcSet, takeInitialData } from '../utils/apiFunctions'; // Оставляем только импорт из apiFunctions.js
 
 import '../styles.css';
 
@@ -19,15 +19,19 @@ const HomePage = () => {
   const [products, setProducts] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     (async () => {
       try {
-        const res = await fetch(`${API_BASE_URL}/products/`, { credentials: 'include' });
-        const result = await res.json();
+        // Первая страница могла прийти вместе с index.html
+        const result = takeInitialData('/')
+          || await (await fetch(`${API_BASE_URL}/products/`, { credentials: 'include' })).json();
         if (result.type === 'success') {
           await loadUserRatings();
           setProducts(result.data.items);
+          setNextCursor(result.data.next_cursor);
         } else {
           setError(result.msg || 'Ошибка получения данных');
         }
@@ -40,6 +44,27 @@ const HomePage = () => {
     })();
   }, []);
 
+  // Следующие страницы грузим по курсору, а не по номеру страницы
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const res = await fetch(
+        `${API_BASE_URL}/products/?after=${encodeURIComponent(nextCursor)}`,
+        { credentials: 'include' }
+      );
+      const result = await res.json();
+      if (result.type === 'success') {
+        setProducts((prev) => [...prev, ...result.data.items]);
+        setNextCursor(result.data.next_cursor);
+      }
+    } catch (err) {
+      console.error('Ошибка при загрузке товаров:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   if (loading) return <p>Загрузка товаров...</p>;
   if (error) return <p>Ошибка: {error}</p>;
   if (!products || products.length === 0) return <p>Нет товаров для отображения</p>;
@@ -47,7 +72,7 @@ const HomePage = () => {
   return (
     <section className="home-page">
       <div className="products-grid">
-        {products.slice(0, 12).map((product) => {
+        {products.map((product) => {
           const rating = getRating(product.id);
           const imageSrc = product.media ? `/${product.media.replace(/\\/g, '/')}` : null;
           return (
@@ -57,6 +82,9 @@ const HomePage = () => {
                   {imageSrc ? (
                     <img
                       src={imageSrc}
+                      srcSet={buildSrcSet(product.media_variants)}
+                      sizes="(max-width: 600px) 50vw, 240px"
+                      loading="lazy"
                       alt={product.name || ''}
                       className="product-image"
                     />
@@ -68,12 +96,20 @@ const HomePage = () => {
                 <p className="product-price">
                   {product.price ? `${product.price}₽` : 'Цена не указана'}
                 </p>
+                <p className="product-rating-summary">
+                  ★ {(product.rating_avg || 0).toFixed(1)} ({product.rating_count || 0})
+                </p>
               </Link>
               <StarRating productId={product.id} currentRating={rating} />
             </div>
           );
         })}
       </div>
+      {nextCursor && (
+        <button className="submit-button" onClick={loadMore} disabled={loadingMore}>
+          {loadingMore ? 'Загрузка...' : 'Показать ещё'}
+        </button>
+      )}
     </section>
   );
 };
@@ -2,7 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';  // Импортируем useNavigate
 import { API_BASE_URL } from '../config';
 import { useAuth } from '../utils/AuthContext';
-import { loadUserRatings, getRating, showNotification } from '../utils/apiFunctions';
+import { loadUserRatings, getRating, showNotification, buildSrcSet, takeInitialData } from '../utils/apiFunctions';
 import { useCart } from '../utils/CartContext';
 import StarRating from '../components/StarRating';
 import '../styles.css';
@@ -30,8 +30,9 @@ const ProductPage = () => {
   useEffect(() => {
     (async () => {
       try {
-        const res = await fetch(`${API_BASE_URL}/products/${productId}`, { credentials: 'include' });
-        const data = await res.json();
+        // Товар мог прийти вместе с index.html
+        const data = takeInitialData(`/product/${productId}`)
+          || await (await fetch(`${API_BASE_URL}/products/${productId}`, { credentials: 'include' })).json();
         if (data.type === 'success') {
           setProduct(data.data);
           await loadUserRatings();
@@ -111,6 +112,8 @@ const ProductPage = () => {
           {imageSrc ? (
             <img
               src={imageSrc}
+              srcSet={buildSrcSet(product.media_variants)}
+              sizes="(max-width: 800px) 100vw, 480px"
               alt={product.name || ''}
               className="product-image"
             />
@@ -158,3 +158,34 @@ export const checkAuthLinks = async () => {
   if (logoutLink) logoutLink.style.display = loggedIn ? 'inline-block' : 'none';
   if (profileLink) profileLink.style.display = loggedIn ? 'inline-block' : 'none';
 };
+
+const mediaPath = (path) => `/${path.replace(/\\/g, '/')}`;
+
+/**
+ * srcSet из product.media_variants: "/files/..._w200.webp 200w, ...".
+ * У старых товаров есть только original — тогда srcSet не нужен.
+ */
+export const buildSrcSet = (variants) =>
+  Object.entries(variants || {})
+    .filter(([width]) => width !== 'original')
+    .map(([width, path]) => `${mediaPath(path)} ${width}w`)
+    .join(', ') || undefined;
+
+/**
+ * Данные первого экрана, встроенные сервером в index.html (SPA_INLINE_DATA).
+ * Отдаются один раз и только для того пути, для которого встроены: после
+ * перехода внутри приложения страница загружает данные сама.
+ */
+export const takeInitialData = (path) => {
+  const script = document.getElementById('__INITIAL_DATA__');
+  if (!script) return null;
+  script.remove();
+
+  try {
+    const initial = JSON.parse(script.textContent);
+    return initial.path === path ? initial.data : null;
+  } catch (err) {
+    console.error('Ошибка чтения встроенных данных:', err);
+    return null;
+  }
+};
@@ -0,0 +1,234 @@
+"""
+Перекодирование уже сохранённых картинок после смены настроек
+(MEDIA_VARIANT_WIDTHS, MEDIA_WEBP_QUALITY). Работу можно прервать:
+прогресс пишется в файл контрольной точки, повторный запуск продолжит с него.
+
+По умолчанию заново строятся только копии — из оригинала, который не
+меняется, поэтому повторы не накапливают потерь. Копии с новыми байтами
+получают новые имена (хэш копии в имени), так что закэшированные как
+неизменные URL не меняют содержимого. С --reencode-original оригинал
+перекодируется в новый файл под хэшем нового содержимого, а товары
+переезжают на него. Старые файлы в обоих случаях потом уберёт media_gc.
+
+    python reencode_media.py
+    python reencode_media.py --workers 8 --reencode-original
+    python reencode_media.py --restart
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from sqlalchemy import bindparam, select, update
+
+from app.api.utils.photo_utils import media_path, media_variant_urls, reencode_original, save_webp_variants
+from app.core.counters import CATALOG_VERSION_COUNTER, increment_counter
+from app.core.image_engine import IMAGE_JOB_TIMEOUT, IMAGE_WORKERS, ImageEngine
+from app.core.media_store import add_media_ref, release_media
+from db.models import MediaBlob, Product
+from db.session import async_session
+
+
+CHECKPOINT_FILE = 'reencode_media.checkpoint.json'
+
+products = Product.__table__
+media_blobs = MediaBlob.__table__
+
+
+def read_checkpoint(path: str) -> dict:
+    try:
+        with open(path, encoding='utf-8') as checkpoint:
+            return json.load(checkpoint)
+    except FileNotFoundError:
+        return {'last_id': 0, 'done': 0, 'failed': 0, 'produced': []}
+
+
+def write_checkpoint(path: str, state: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as checkpoint:
+        json.dump(state, checkpoint)
+    os.replace(tmp_path, path)
+
+
+async def read_page(last_id: int, size: int) -> list:
+    """
+    Следующие size товаров после last_id через серверный курсор. Курсор
+    закрывается до записи результатов: в SQLite открытое чтение не даёт
+    закоммитить запись из другого соединения.
+    """
+    async with async_session() as session:
+        result = await session.stream(
+            select(Product.id, Product.media, Product.media_hash)
+            .where(Product.id > last_id, Product.media_status == 'ready', Product.media != '')
+            .order_by(Product.id)
+            .limit(size)
+            .execution_options(yield_per=size)
+        )
+        return [row async for row in result]
+
+
+async def regenerate(engine: ImageEngine, media: str, new_original: bool) -> tuple:
+    """(новый хэш или None, ссылки на файлы)"""
+    path = media_path(media)
+    if new_original:
+        digest, variants = await engine.run(reencode_original, path, wait=True)
+        return digest, media_variant_urls(variants)
+
+    variants = await engine.run(save_webp_variants, path, path, save_original=False, wait=True)
+    return None, media_variant_urls(variants)
+
+
+async def save_variants(results: list):
+    """
+    Новые карты копий одной транзакцией: по индексу media_hash — сразу всем
+    товарам с той же картинкой, старым файлам без хэша — по id со страницы.
+    """
+    by_hash = [
+        {'b_hash': old_digest, 'b_variants': variants}
+        for _, old_digest, _, variants in results if old_digest is not None
+    ]
+    by_id = [
+        {'b_id': product_id, 'b_variants': variants}
+        for ids, old_digest, _, variants in results if old_digest is None
+        for product_id in ids
+    ]
+
+    async with async_session() as session:
+        if by_hash:
+            await session.execute(
+                update(products)
+                .where(products.c.media_hash == bindparam('b_hash'))
+                .values(media_variants=bindparam('b_variants'), version=products.c.version + 1),
+                by_hash
+            )
+            await session.execute(
+                update(media_blobs)
+                .where(media_blobs.c.hash == bindparam('b_hash'))
+                .values(variants=bindparam('b_variants')),
+                by_hash
+            )
+        if by_id:
+            await session.execute(
+                update(products)
+                .where(products.c.id == bindparam('b_id'))
+                .values(media_variants=bindparam('b_variants'), version=products.c.version + 1),
+                by_id
+            )
+        await increment_counter(session, CATALOG_VERSION_COUNTER)
+        await session.commit()
+
+
+async def save_originals(results: list):
+    """
+    Товары страницы — на новые оригиналы, ссылки в media_blobs переносятся
+    со старых хэшей на новые. Товары с той же картинкой на следующих
+    страницах переедут вместе со своей страницей.
+    """
+    async with async_session() as session:
+        await session.execute(
+            update(products)
+            .where(products.c.id == bindparam('b_id'))
+            .values(
+                media=bindparam('b_media'),
+                media_variants=bindparam('b_variants'),
+                media_hash=bindparam('b_hash'),
+                version=products.c.version + 1
+            ),
+            [
+                {'b_id': product_id, 'b_media': variants['original'], 'b_variants': variants, 'b_hash': new_digest}
+                for ids, _, new_digest, variants in results
+                for product_id in ids
+            ]
+        )
+        for ids, old_digest, new_digest, variants in results:
+            await add_media_ref(session, new_digest, variants, len(ids))
+            await release_media(session, old_digest, len(ids))
+        await increment_counter(session, CATALOG_VERSION_COUNTER)
+        await session.commit()
+
+
+async def main(args):
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    state = read_checkpoint(args.checkpoint)
+    if state['last_id']:
+        print(f"продолжение с товара {state['last_id']}: готово {state['done']}, ошибок {state['failed']}")
+
+    engine = ImageEngine(workers=args.workers, max_pending=args.workers * 2, timeout=IMAGE_JOB_TIMEOUT)
+    await engine.warm_up()
+    started = time.monotonic()
+    processed = 0
+
+    try:
+        while rows := await read_page(state['last_id'], args.batch_size):
+            # Оригиналы, уже перекодированные запуском, который прервался
+            # между коммитом и контрольной точкой, — второй раз нельзя
+            produced = set(state.get('produced', []))
+
+            # Картинка, общая для нескольких товаров страницы, кодируется один раз
+            groups = {}
+            for product_id, media, digest in rows:
+                if digest is not None and digest in produced:
+                    continue
+                group = groups.setdefault(digest or media, (media, digest, []))
+                group[2].append(product_id)
+
+            results = await asyncio.gather(
+                *(regenerate(engine, media, args.reencode_original) for media, _, _ in groups.values()),
+                return_exceptions=True
+            )
+
+            saved = []
+            for (media, old_digest, ids), result in zip(groups.values(), results):
+                if isinstance(result, Exception):
+                    state['failed'] += 1
+                    print(f"{media}: {result}", file=sys.stderr)
+                    continue
+                new_digest, variants = result
+                saved.append((ids, old_digest, new_digest, variants))
+
+            if saved and args.reencode_original:
+                state['produced'] = [new_digest for _, _, new_digest, _ in saved]
+                write_checkpoint(args.checkpoint, state)
+                await save_originals(saved)
+            elif saved:
+                # Заменённые копии удалять здесь нельзя: на них ещё
+                # ссылаются закэшированные страницы. Их уберёт media_gc
+                await save_variants(saved)
+
+            processed += len(groups)
+            state['done'] += len(saved)
+            state['last_id'] = rows[-1][0]
+            state['produced'] = []
+            write_checkpoint(args.checkpoint, state)
+
+            elapsed = time.monotonic() - started
+            print(
+                f"товар {state['last_id']}: готово {state['done']}, ошибок {state['failed']}, "
+                f"{processed / elapsed:.1f} картинок/с"
+            )
+    finally:
+        engine.shutdown()
+
+    elapsed = time.monotonic() - started
+    print(json.dumps({
+        'images': processed,
+        'done': state['done'],
+        'failed': state['failed'],
+        'elapsed_seconds': round(elapsed, 3),
+        'images_per_second': round(processed / elapsed, 1) if elapsed else None,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Перекодирование картинок товаров')
+    parser.add_argument('--workers', type=int, default=IMAGE_WORKERS, help='процессов кодирования')
+    parser.add_argument('--batch-size', type=int, default=100, help='товаров между контрольными точками')
+    parser.add_argument('--reencode-original', action='store_true',
+                        help='перекодировать и оригинал (в новый файл под новым хэшем)')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE)
+    parser.add_argument('--restart', action='store_true', help='начать с начала, забыв контрольную точку')
+
+    asyncio.run(main(parser.parse_args()))